@@ -1,9 +1,15 @@
 from functools import cache
 
 from flask import Flask
+from json_provider import OrjsonProvider
 
 
-@cache
-def get_app() -> Flask:
+def build_app() -> Flask:
     app = Flask("todo")
+    app.json = OrjsonProvider(app)
     return app
+
+
+@cache
+def get_app() -> Flask:
+    return build_app()
@@ -0,0 +1,57 @@
+from contextlib import asynccontextmanager
+
+from async_views import (
+    LoginView,
+    TodoBulkView,
+    TodoEventsView,
+    TodoExportView,
+    TodoStatsView,
+    TodoView,
+    UserView,
+    get_json_response,
+)
+from change_feed import change_feed
+from errors import HttpError
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+
+
+async def not_found(request: Request, err: Exception):
+    return get_json_response({"description": "url not found"}, 404)
+
+
+async def unexpected(request: Request, err: Exception):
+    return get_json_response({"description": "unexpected error"}, 500)
+
+
+async def handle_error(request: Request, error: HttpError):
+    response = get_json_response(
+        {"status": "error", "description": error.description}, error.status_code
+    )
+    response.headers.update(error.headers)
+    return response
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    yield
+    await change_feed.stop()
+
+
+routes = [
+    Route("/user", UserView, methods=["GET", "POST", "PATCH", "DELETE"]),
+    Route("/login", LoginView, methods=["POST", "DELETE"]),
+    Route("/todo", TodoView, methods=["POST", "GET"]),
+    Route("/todo/bulk", TodoBulkView, methods=["POST"]),
+    Route("/todo/events", TodoEventsView, methods=["GET"]),
+    Route("/todo/export", TodoExportView, methods=["GET"]),
+    Route("/todo/stats", TodoStatsView, methods=["GET"]),
+    Route("/todo/{todo_id:int}", TodoView, methods=["GET", "PATCH", "DELETE"]),
+]
+
+app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    exception_handlers={404: not_found, 500: unexpected, HttpError: handle_error},
+)
@@ -0,0 +1,22 @@
+from functools import cache
+
+from config import ASYNC_DB_URL
+from db_pool import get_pool_options, track_pool
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+
+@cache
+def get_async_engine() -> AsyncEngine:
+    async_engine = create_async_engine(ASYNC_DB_URL, **get_pool_options(is_async=True))
+    track_pool(async_engine.sync_engine, "async")
+    return async_engine
+
+
+class LazyAsyncEngineSession(Session):
+    def get_bind(self, *args, **kwargs) -> Engine:
+        return get_async_engine().sync_engine
+
+
+AsyncSession = async_sessionmaker(sync_session_class=LazyAsyncEngineSession)
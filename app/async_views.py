@@ -0,0 +1,400 @@
+import asyncio
+from urllib.parse import urlencode
+
+from async_db import AsyncSession
+from auth import (
+    check_owner,
+    check_password,
+    forget_user_tokens,
+    get_token,
+    get_token_user,
+    hash_password,
+    needs_rehash,
+)
+from change_feed import change_feed
+from config import CHANGE_FEED_KEEPALIVE
+from crud import (
+    bulk_todos,
+    create_item,
+    create_token,
+    delete_item,
+    delete_owned_item,
+    get_item_by_id,
+    get_next_page,
+    get_todo_changes,
+    get_todo_list,
+    get_todo_stats,
+    get_user_summary,
+    get_user_version,
+    revoke_tokens,
+    stream_todos_query,
+    update_item,
+    update_owned_item,
+)
+from errors import HttpError
+from models import Todo, User
+from rate_limit import check_rate_limits
+from response_cache import (
+    CachedResponse,
+    get_cache_key,
+    get_cached_headers,
+    response_cache,
+)
+from schema import (
+    TODO_LIST_DEFAULT_LIMIT,
+    BulkTodo,
+    CreateTodo,
+    CreateUser,
+    Login,
+    LogoutQuery,
+    PatchUser,
+    TodoListQuery,
+    TodoStatsQuery,
+    UpdateTodo,
+    UserQuery,
+)
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession as AsyncSessionType
+from starlette.concurrency import run_in_threadpool
+from starlette.endpoints import HTTPEndpoint
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from tools import validate, validate_json
+
+from app import get_app
+
+JSON_METHODS = frozenset({"POST", "PUT", "PATCH"})
+JSON_MIMETYPE = "application/json"
+
+
+def get_json_response(json_data: dict | list, status_code: int = 200) -> Response:
+    return Response(
+        get_app().json.dumps_bytes(json_data) + b"\n",
+        status_code,
+        media_type=JSON_MIMETYPE,
+    )
+
+
+def is_json(request: Request) -> bool:
+    mimetype = request.headers.get("content-type", "").split(";")[0].strip()
+    return mimetype == JSON_MIMETYPE or (
+        mimetype.startswith("application/") and mimetype.endswith("+json")
+    )
+
+
+def check_token(handler):
+    async def wrapper(self, request: Request):
+        token = request.headers.get("Authorization")
+        if token is None:
+            raise HttpError(401, "token not found")
+        token = await self.session.run_sync(lambda session: get_token(token, session))
+        if token is None:
+            raise HttpError(401, "invalid token")
+        request.state.token_id = token.token_id
+        request.state.user_id = token.user_id
+        return await handler(self, request)
+
+    return wrapper
+
+
+def if_none_match(request: Request) -> set[str]:
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip().removeprefix("W/").strip('"') for tag in header.split(",")}
+
+
+def conditional(handler):
+    async def wrapper(self, request: Request):
+        user_id = request.state.user_id
+        version = await self.session.run_sync(
+            lambda session: get_user_version(user_id, session)
+        )
+        if version is None:
+            forget_user_tokens(user_id)
+            raise HttpError(401, "invalid token")
+        request.state.user_version = version
+        etag = f"{user_id}-{version}"
+        tags = if_none_match(request)
+        if etag in tags or "*" in tags:
+            response = Response(status_code=304)
+        else:
+            response = await handler(self, request)
+        response.headers["ETag"] = f'W/"{etag}"'
+        return response
+
+    return wrapper
+
+
+def cached(handler):
+    async def wrapper(self, request: Request):
+        user_id = request.state.user_id
+        key = get_cache_key(request.url.path, request.url.query)
+        version = request.state.user_version
+        cached_response = response_cache.get(user_id, version, key)
+        if cached_response is not None:
+            return Response(
+                cached_response.body,
+                headers=cached_response.headers,
+                media_type=JSON_MIMETYPE,
+            )
+        response = await handler(self, request)
+        if response.status_code == 200:
+            response_cache.set(
+                user_id,
+                version,
+                key,
+                CachedResponse(response.body, get_cached_headers(response.headers)),
+            )
+        return response
+
+    return wrapper
+
+
+class BaseView(HTTPEndpoint):
+    endpoint: str
+    session: AsyncSessionType
+
+    async def dispatch(self):
+        request = Request(self.scope, receive=self.receive)
+        await run_in_threadpool(
+            check_rate_limits,
+            self.endpoint,
+            {
+                "ip": request.client and request.client.host,
+                "token": request.headers.get("Authorization"),
+            },
+        )
+        if request.method in JSON_METHODS and not is_json(request):
+            raise HttpError(400, "json format expected")
+        async with AsyncSession() as self.session:
+            await super().dispatch()
+
+
+class UserView(BaseView):
+    endpoint = "user"
+
+    @check_token
+    @conditional
+    async def get(self, request: Request):
+        query = validate(UserQuery, dict(request.query_params))
+        user_id = request.state.user_id
+        user = await self.session.run_sync(
+            lambda session: get_user_summary(user_id, session, **query)
+        )
+        if user is None:
+            forget_user_tokens(user_id)
+            raise HttpError(401, "invalid token")
+        return get_json_response(user)
+
+    async def post(self, request: Request):
+        payload = validate_json(CreateUser, await request.body())
+        payload["password"] = await run_in_threadpool(
+            hash_password, payload["password"]
+        )
+        user_id = await self.session.run_sync(
+            lambda session: create_item(User, payload, session).id
+        )
+        return get_json_response({"id": user_id})
+
+    @check_token
+    async def patch(self, request: Request):
+        payload = validate_json(PatchUser, await request.body())
+        if "password" in payload:
+            payload["password"] = await run_in_threadpool(
+                hash_password, payload["password"]
+            )
+        user_id = request.state.user_id
+        user_id = await self.session.run_sync(
+            lambda session: update_item(
+                get_token_user(user_id, session), payload, session
+            ).id
+        )
+        return get_json_response({"id": user_id})
+
+    @check_token
+    async def delete(self, request: Request):
+        user_id = request.state.user_id
+        await self.session.run_sync(
+            lambda session: delete_item(get_token_user(user_id, session), session)
+        )
+        forget_user_tokens(user_id)
+        return get_json_response({"status": "ok"})
+
+
+class LoginView(BaseView):
+    endpoint = "login"
+
+    async def post(self, request: Request):
+        payload = validate_json(Login, await request.body())
+        user = await self.session.run_sync(
+            lambda session: session.query(User).filter_by(name=payload["name"]).first()
+        )
+        if user is None:
+            raise HttpError(404, "user not found")
+        if await run_in_threadpool(check_password, user.password, payload["password"]):
+            if needs_rehash(user.password):
+                user.password = await run_in_threadpool(
+                    hash_password, payload["password"]
+                )
+            user_id = user.id
+            token = await self.session.run_sync(
+                lambda session: create_token(user_id, session)
+            )
+            return get_json_response(token)
+        raise HttpError(401, "invalid password")
+
+    @check_token
+    async def delete(self, request: Request):
+        query = validate(LogoutQuery, dict(request.query_params))
+        user_id = request.state.user_id
+        token_id = None if query.get("all") else request.state.token_id
+        await self.session.run_sync(
+            lambda session: revoke_tokens(user_id, session, token_id)
+        )
+        return get_json_response({"status": "ok"})
+
+
+class TodoView(BaseView):
+    endpoint = "todo"
+
+    @check_token
+    @conditional
+    @cached
+    async def get(self, request: Request):
+        todo_id = request.path_params.get("todo_id")
+        if todo_id is None:
+            return await self.get_list(request)
+        user_id = request.state.user_id
+
+        def get_todo(session):
+            todo = get_item_by_id(Todo, todo_id, session)
+            check_owner(todo, user_id)
+            return todo.dict
+
+        return get_json_response(await self.session.run_sync(get_todo))
+
+    async def get_list(self, request: Request):
+        query = validate(TodoListQuery, dict(request.query_params))
+        user_id = request.state.user_id
+        if "since" in query:
+            changes = await self.session.run_sync(
+                lambda session: get_todo_changes(user_id, session, query["since"])
+            )
+            return get_json_response(changes)
+        todos = await self.session.run_sync(
+            lambda session: [
+                todo.dict for todo in get_todo_list(user_id, session, **query)
+            ]
+        )
+        response = get_json_response(todos)
+        if len(todos) == query.get("limit", TODO_LIST_DEFAULT_LIMIT):
+            next_page = get_next_page(query, todos[-1]["id"])
+            next_url = f"/todo?{urlencode(next_page)}"
+            response.headers["Link"] = f'<{next_url}>; rel="next"'
+        return response
+
+    @check_token
+    async def post(self, request: Request):
+        payload = validate_json(CreateTodo, await request.body())
+        payload["user_id"] = request.state.user_id
+        todo_id = await self.session.run_sync(
+            lambda session: create_item(Todo, payload, session).id
+        )
+        return get_json_response({"id": todo_id})
+
+    @check_token
+    async def patch(self, request: Request):
+        payload = validate_json(UpdateTodo, await request.body())
+        if "done" in payload:
+            payload["finish_time"] = func.now()
+        todo_id = request.path_params["todo_id"]
+        user_id = request.state.user_id
+        todo_id = await self.session.run_sync(
+            lambda session: update_owned_item(Todo, todo_id, user_id, payload, session)
+        )
+        return get_json_response({"id": todo_id})
+
+    @check_token
+    async def delete(self, request: Request):
+        todo_id = request.path_params["todo_id"]
+        user_id = request.state.user_id
+        await self.session.run_sync(
+            lambda session: delete_owned_item(Todo, todo_id, user_id, session)
+        )
+        return get_json_response({"status": "ok"})
+
+
+class TodoBulkView(BaseView):
+    endpoint = "todo_bulk"
+
+    @check_token
+    async def post(self, request: Request):
+        payload = validate_json(BulkTodo, await request.body())
+        user_id = request.state.user_id
+        result = await self.session.run_sync(
+            lambda session: bulk_todos(user_id, payload, session)
+        )
+        return get_json_response(result)
+
+
+class TodoStatsView(BaseView):
+    endpoint = "todo_stats"
+
+    @check_token
+    @conditional
+    @cached
+    async def get(self, request: Request):
+        query = validate(TodoStatsQuery, dict(request.query_params))
+        user_id = request.state.user_id
+        stats = await self.session.run_sync(
+            lambda session: get_todo_stats(user_id, session, **query)
+        )
+        return get_json_response(stats)
+
+
+class TodoExportView(BaseView):
+    endpoint = "todo_export"
+
+    @check_token
+    async def get(self, request: Request):
+        user_id = request.state.user_id
+        await self.session.run_sync(lambda session: get_token_user(user_id, session))
+        todos = await self.session.stream_scalars(stream_todos_query(user_id))
+        dumps = get_app().json.dumps_bytes
+
+        async def generate():
+            async for todo in todos:
+                yield dumps(todo.dict) + b"\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+class TodoEventsView(BaseView):
+    endpoint = "todo_events"
+
+    @check_token
+    async def get(self, request: Request):
+        user_id = request.state.user_id
+        await self.session.run_sync(lambda session: get_token_user(user_id, session))
+        await self.session.close()
+        dumps = get_app().json.dumps_bytes
+
+        async def generate():
+            async with change_feed.subscribe(user_id) as queue:
+                yield b": connected\n\n"
+                while True:
+                    try:
+                        message = await asyncio.wait_for(
+                            queue.get(), CHANGE_FEED_KEEPALIVE
+                        )
+                    except asyncio.TimeoutError:
+                        yield b": keepalive\n\n"
+                        continue
+                    if message is None:
+                        return
+                    yield b"event: change\ndata: " + dumps(message) + b"\n\n"
+
+        return StreamingResponse(
+            generate(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
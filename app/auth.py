@@ -1,19 +1,254 @@
+import datetime
+import multiprocessing
+import os
+import selectors
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import cache
+from typing import Any, Callable, Hashable, Iterable, NamedTuple
+
+import orjson
+import psycopg2
+from cache import TTLCache
+from config import (
+    BCRYPT_LOG_ROUNDS,
+    DB_URL,
+    HASH_QUEUE_SIZE,
+    HASH_QUEUE_TIMEOUT,
+    HASH_WORKERS,
+    TOKEN_CACHE_CHANNEL,
+    TOKEN_CACHE_PING_INTERVAL,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TTL,
+    TOKEN_REFRESH_INTERVAL,
+    TOKEN_TTL,
+)
 from errors import HttpError
 from flask import request
-from flask_bcrypt import Bcrypt
-from models import MODEL, Token
+from flask_bcrypt import check_password_hash, generate_password_hash
+from models import MODEL, Token, User, leave_replica
+from sqlalchemy import ColumnElement, func, select, text, update
+from sqlalchemy.orm import Session
+from timing import timed
+
+
+class CachedToken(NamedTuple):
+    token_id: int
+    user_id: int
+    expires_at: datetime.datetime
+
+
+class TokenCache(TTLCache):
+    def __init__(self, maxsize: int, ttl: float, dsn: str, channel: str):
+        super().__init__(maxsize, ttl)
+        self.dsn = dsn
+        self.channel = channel
+        self.generation = 0
+        self._pid = None
+        self._connected = threading.Event()
+        self._stopped = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        if not self.channel or self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._connected.clear()
+                self._stopped.clear()
+                threading.Thread(target=self.listen, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def wait(self, timeout: float) -> bool:
+        self.start()
+        return not self.channel or self._connected.wait(timeout)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        self.start()
+        if self.channel and not self._connected.is_set():
+            return default
+        return super().get(key, default)
+
+    def set(self, key: Hashable, value: Any, generation: int = None):
+        with self._lock:
+            if generation is None or generation == self.generation:
+                self._set(key, value)
+
+    def evict(self, tokens: Iterable[str] = (), user_id: int = None):
+        with self._lock:
+            self.generation += 1
+        for token in tokens:
+            self.pop(token)
+        if user_id is not None:
+            self.remove_if(lambda token, cached: cached.user_id == user_id)
+
+    def listen(self):
+        while not self._stopped.is_set():
+            try:
+                self.receive()
+            except (psycopg2.Error, OSError):
+                time.sleep(TOKEN_CACHE_PING_INTERVAL)
+
+    def receive(self):
+        connection = psycopg2.connect(self.dsn)
+        try:
+            connection.autocommit = True
+            cursor = connection.cursor()
+            cursor.execute(f"LISTEN {self.channel}")
+            with self._lock:
+                self.generation += 1
+                self._items.clear()
+            self._connected.set()
+            with selectors.DefaultSelector() as selector:
+                selector.register(connection, selectors.EVENT_READ)
+                while not self._stopped.is_set():
+                    if not selector.select(TOKEN_CACHE_PING_INTERVAL):
+                        cursor.execute("SELECT 1")
+                    connection.poll()
+                    while connection.notifies:
+                        self.evict(**orjson.loads(connection.notifies.pop(0).payload))
+        finally:
+            self._connected.clear()
+            connection.close()
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL, DB_URL, TOKEN_CACHE_CHANNEL)
+
+
+hash_queue = threading.BoundedSemaphore(HASH_QUEUE_SIZE)
+hash_pool_lock = threading.Lock()
+
+
+@cache
+def get_hash_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def reset_hash_pool(pool: ProcessPoolExecutor):
+    with hash_pool_lock:
+        if get_hash_pool() is pool:
+            get_hash_pool.cache_clear()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def call_hash_pool(job: Callable, *args):
+    with hash_pool_lock:
+        pool = get_hash_pool()
+    try:
+        return pool.submit(job, *args).result()
+    except BrokenProcessPool:
+        reset_hash_pool(pool)
+        raise
+
+
+def run_hash_job(job: Callable, *args):
+    if HASH_WORKERS == 0:
+        with timed("hash"):
+            return job(*args)
+    with timed("hash"):
+        if not hash_queue.acquire(timeout=HASH_QUEUE_TIMEOUT):
+            raise HttpError(503, "server is busy")
+        try:
+            try:
+                return call_hash_pool(job, *args)
+            except BrokenProcessPool:
+                return call_hash_pool(job, *args)
+        finally:
+            hash_queue.release()
+
+
+def hash_password(password: str) -> str:
+    return run_hash_job(
+        generate_password_hash, password.encode(), BCRYPT_LOG_ROUNDS
+    ).decode()
+
+
+def check_password(password_hash: str, password: str) -> bool:
+    return run_hash_job(check_password_hash, password_hash.encode(), password.encode())
+
+
+def needs_rehash(password_hash: str) -> bool:
+    return int(password_hash.split("$")[2]) != BCRYPT_LOG_ROUNDS
+
+
+def get_token_expiry() -> ColumnElement:
+    return func.now() + datetime.timedelta(seconds=TOKEN_TTL)
+
+
+def refresh_token(
+    token: str, cached: CachedToken, session: Session
+) -> CachedToken | None:
+    expires_at = session.scalar(
+        update(Token)
+        .where(Token.id == cached.token_id, Token.expires_at > func.now())
+        .values(expires_at=get_token_expiry())
+        .returning(Token.expires_at)
+    )
+    session.commit()
+    if expires_at is None:
+        token_cache.pop(token)
+        return None
+    cached = cached._replace(expires_at=expires_at)
+    token_cache.set(token, cached)
+    return cached
+
+
+def get_token(token: str, session: Session) -> CachedToken | None:
+    generation = token_cache.generation
+    cached = token_cache.get(token)
+    if cached is None:
+        row = session.execute(
+            select(Token.id, Token.user_id, Token.expires_at).where(
+                Token.token == token, Token.expires_at > func.now()
+            )
+        ).first()
+        if row is None:
+            return None
+        cached = CachedToken(*row)
+        token_cache.set(token, cached, generation)
+    expires_in = cached.expires_at - datetime.datetime.now(datetime.timezone.utc)
+    if expires_in <= datetime.timedelta(0):
+        token_cache.pop(token)
+        return None
+    if expires_in.total_seconds() < TOKEN_TTL - TOKEN_REFRESH_INTERVAL:
+        return refresh_token(token, cached, session)
+    return cached
+
+
+def broadcast_revocation(session: Session, tokens: Iterable = (), user_id: int = None):
+    if not TOKEN_CACHE_CHANNEL:
+        return
+    payload = {"tokens": [str(token) for token in tokens], "user_id": user_id}
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": TOKEN_CACHE_CHANNEL, "payload": orjson.dumps(payload).decode()},
+    )
 
-from app import get_app
 
-bcrypt = Bcrypt(get_app())
+def forget_tokens(tokens: Iterable):
+    for token in tokens:
+        token_cache.pop(str(token))
 
 
-def hash_password(password: str):
-    return bcrypt.generate_password_hash(password.encode()).decode()
+def forget_user_tokens(user_id: int):
+    token_cache.remove_if(lambda token, cached: cached.user_id == user_id)
 
 
-def check_password(password: str, hashed_password: str):
-    return bcrypt.check_password_hash(password.encode(), hashed_password.encode())
+def get_token_user(user_id: int, session: Session) -> User:
+    user = session.get(User, user_id)
+    if user is None and leave_replica(session):
+        user = session.get(User, user_id)
+    if user is None:
+        forget_user_tokens(user_id)
+        raise HttpError(401, "invalid token")
+    return user
 
 
 def check_token(handler):
@@ -21,10 +256,10 @@ def check_token(handler):
         token = request.headers.get("Authorization")
         if token is None:
             raise HttpError(401, "token not found")
-        token = request.session.query(Token).filter_by(token=token).first()
+        token = get_token(token, request.session)
         if token is None:
             raise HttpError(401, "invalid token")
-        request.token = token
+        request.token_id, request.user_id = token.token_id, token.user_id
         return handler(*args, **kwargs)
 
     return wrapper
@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("p50_ms", "p99_ms", "bytes")
+HIGHER_IS_BETTER = ("rps",)
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, dict]:
+    flat = {}
+    for name, result in results.items():
+        if "count" in result:
+            flat[f"{prefix}{name}"] = result
+        else:
+            flat.update(flatten(result, f"{prefix}{name}."))
+    return flat
+
+
+def load(path: str) -> dict[str, dict]:
+    with open(path) as file:
+        return flatten(json.load(file)["results"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    regressions = 0
+    for name in sorted(baseline.keys() & candidate.keys()):
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = baseline[name].get(metric), candidate[name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = (
+                change > args.threshold
+                if metric in LOWER_IS_BETTER
+                else change < -args.threshold
+            )
+            regressions += regressed
+            mark = "REGRESSION" if regressed else ""
+            print(f"{name:70} {metric:7} {old:10.2f} {new:10.2f} {change:+8.1%} {mark}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import migrations
+import pytest
+from tests.conftest import flask_app, test_client_factory  # noqa: F401
+
+from .remote_client import RemoteClient
+from .utils import BENCH_URL, drop_bench_users
+
+
+@pytest.fixture(scope="session", autouse=True)
+def init_db():
+    migrations.init_db()
+    drop_bench_users()
+
+
+@pytest.fixture(scope="session")
+def bench_client_factory(test_client_factory):
+    if BENCH_URL:
+        return lambda: RemoteClient(BENCH_URL)
+    return test_client_factory
@@ -0,0 +1,35 @@
+import requests
+
+
+class RemoteClient:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def open(
+        self,
+        method: str,
+        url: str,
+        json: dict = None,
+        headers: dict = None,
+        query_string: dict = None,
+    ) -> requests.Response:
+        return self.session.request(
+            method,
+            f"{self.base_url}{url}",
+            json=json,
+            headers=headers,
+            params=query_string,
+        )
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.open("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.open("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.open("PATCH", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.open("DELETE", url, **kwargs)
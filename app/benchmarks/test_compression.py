@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+from models import Todo
+from response_compression import compress, compress_stream
+
+from app import get_app
+
+from .utils import BENCH_DURATION, record, run_for, summarize
+
+brotli = pytest.importorskip("brotli")
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 9]}
+
+
+def get_payload(todos: int) -> tuple[bytes, list[bytes]]:
+    now = datetime.datetime.now()
+    items = [
+        Todo(
+            id=number,
+            user_id=1,
+            name=f"todo_{number}",
+            important=number % 3 == 0,
+            done=number % 2 == 0,
+            start_time=now,
+            finish_time=now if number % 2 == 0 else None,
+            updated_at=now,
+        ).dict
+        for number in range(todos)
+    ]
+    dumps = get_app().json.dumps_bytes
+    return dumps(items), [dumps(item) + b"\n" for item in items]
+
+
+@pytest.mark.parametrize("encoding", LEVELS)
+@pytest.mark.parametrize("todos", [100, 1000, 10000])
+def test_compression(monkeypatch, encoding, todos):
+    body, lines = get_payload(todos)
+    for level in LEVELS[encoding]:
+        monkeypatch.setattr("response_compression.COMPRESSION_GZIP_LEVEL", level)
+        monkeypatch.setattr("response_compression.COMPRESSION_BROTLI_QUALITY", level)
+        compressed = compress(body, encoding)
+        samples = run_for(BENCH_DURATION, lambda: compress(body, encoding))
+        record(
+            f"compression[todos={todos},encoding={encoding},level={level}]",
+            {
+                **summarize(samples, BENCH_DURATION),
+                "bytes": len(compressed),
+                "ratio": len(body) / len(compressed),
+                "mb_per_s": len(body) * len(samples) / BENCH_DURATION / 2**20,
+            },
+        )
+        streamed = b"".join(compress_stream(iter(lines), encoding))
+        samples = run_for(
+            BENCH_DURATION, lambda: b"".join(compress_stream(iter(lines), encoding))
+        )
+        record(
+            f"compression_stream[todos={todos},encoding={encoding},level={level}]",
+            {
+                **summarize(samples, BENCH_DURATION),
+                "bytes": len(streamed),
+                "ratio": sum(map(len, lines)) / len(streamed),
+            },
+        )
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+from tests.api_client import TodoApiClient
+from tests.constants import DEFAULT_USER_PASSWORD
+
+from .utils import (
+    BENCH_CONCURRENCY,
+    BENCH_DURATION,
+    BENCH_MODE,
+    BENCH_SCALES,
+    BENCH_USERS,
+    drop_users,
+    record,
+    run_concurrently,
+    seed_todos,
+    seed_users,
+    summarize,
+)
+
+ENDPOINTS = {
+    "get_user": lambda client, todo_ids: client.get_user(),
+    "get_todos": lambda client, todo_ids: client.get_todos(),
+    "search_todos": lambda client, todo_ids: client.get_todos(
+        q=f"_{random.randrange(100, 1000)}", limit=10
+    ),
+    "todo_stats": lambda client, todo_ids: client.get_todo_stats(),
+    "get_todo": lambda client, todo_ids: client.get_todo(random.choice(todo_ids)),
+    "create_todo": lambda client, todo_ids: client.create_todo("bench_create"),
+    "update_todo": lambda client, todo_ids: client.update_todo(
+        random.choice(todo_ids), name="bench_update"
+    ),
+    "bulk_todos": lambda client, todo_ids: client.bulk_todos(
+        update=[{"id": todo_id, "done": True} for todo_id in todo_ids[:100]]
+    ),
+    "export_todos": lambda client, todo_ids: client.export_todos(),
+}
+
+
+@pytest.fixture(scope="module", params=BENCH_SCALES, ids=lambda scale: f"{scale}")
+def seeded_client(request, bench_client_factory):
+    scale = request.param
+    user_ids = seed_users(f"bench_{scale}", BENCH_USERS, DEFAULT_USER_PASSWORD)
+    for user_id in user_ids:
+        seed_todos(user_id, scale // BENCH_USERS)
+    client = TodoApiClient(bench_client_factory(), verbose=False)
+    client.auth(f"bench_{scale}_0", DEFAULT_USER_PASSWORD)
+    todo_ids = [todo.id for todo in client.get_todos()]
+    yield scale, client, todo_ids
+    drop_users(user_ids)
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_endpoint(seeded_client, endpoint):
+    scale, client, todo_ids = seeded_client
+    call = ENDPOINTS[endpoint]
+    samples = run_concurrently(
+        BENCH_DURATION, BENCH_CONCURRENCY, lambda: call(client, todo_ids)
+    )
+    record(
+        f"{endpoint}[scale={scale},mode={BENCH_MODE}]",
+        summarize(samples, BENCH_DURATION),
+    )
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import auth
+import pytest
+from config import HASH_WORKERS
+from tests.api_client import TodoApiClient
+from tests.constants import DEFAULT_USER_PASSWORD
+
+from .utils import (
+    BENCH_CONCURRENCY,
+    BENCH_DURATION,
+    BENCH_MODE,
+    record,
+    run_for,
+    summarize,
+)
+
+
+@pytest.mark.parametrize("hash_workers", [0, 2])
+def test_login_mixed_load(bench_client_factory, monkeypatch, hash_workers):
+    if BENCH_MODE == "remote" and hash_workers != HASH_WORKERS:
+        pytest.skip("HASH_WORKERS is configured on the benchmarked server")
+    monkeypatch.setattr(auth, "HASH_WORKERS", hash_workers)
+    name = f"bench_login_{hash_workers}"
+    reader = TodoApiClient(bench_client_factory(), verbose=False)
+    reader.create_user(name, DEFAULT_USER_PASSWORD)
+    reader.auth(name, DEFAULT_USER_PASSWORD)
+    reader.create_todo("bench_login_todo")
+
+    def login():
+        client = TodoApiClient(bench_client_factory(), verbose=False)
+        return run_for(
+            BENCH_DURATION, lambda: client.login(name, DEFAULT_USER_PASSWORD)
+        )
+
+    def read():
+        return run_for(BENCH_DURATION, reader.get_todos)
+
+    with ThreadPoolExecutor(BENCH_CONCURRENCY * 2) as executor:
+        logins = [executor.submit(login) for _ in range(BENCH_CONCURRENCY)]
+        reads = [executor.submit(read) for _ in range(BENCH_CONCURRENCY)]
+        login_samples = [sample for job in logins for sample in job.result()]
+        read_samples = [sample for job in reads for sample in job.result()]
+
+    record(
+        f"login_mixed_load[hash_workers={hash_workers},mode={BENCH_MODE}]",
+        {
+            "login": summarize(login_samples, BENCH_DURATION),
+            "get_todos": summarize(read_samples, BENCH_DURATION),
+        },
+    )
+    reader.delete_user()
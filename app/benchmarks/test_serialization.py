@@ -0,0 +1,40 @@
+import datetime
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+from json_provider import OrjsonProvider
+from models import Todo
+
+from app import get_app
+
+from .utils import BENCH_DURATION, record, run_for, summarize
+
+PROVIDERS = {"stdlib": DefaultJSONProvider, "orjson": OrjsonProvider}
+
+
+@pytest.mark.parametrize("provider", PROVIDERS)
+@pytest.mark.parametrize("todos", [100, 1000, 10000])
+def test_todo_list_serialization(provider, todos):
+    now = datetime.datetime.now()
+    items = [
+        Todo(
+            id=number,
+            user_id=1,
+            name=f"todo_{number}",
+            important=number % 3 == 0,
+            done=number % 2 == 0,
+            start_time=now,
+            finish_time=now if number % 2 == 0 else None,
+        )
+        for number in range(todos)
+    ]
+    app = get_app()
+    json = PROVIDERS[provider](app)
+    with app.app_context():
+        samples = run_for(
+            BENCH_DURATION, lambda: json.response([todo.dict for todo in items])
+        )
+    record(
+        f"todo_list_serialization[todos={todos},provider={provider}]",
+        summarize(samples, BENCH_DURATION),
+    )
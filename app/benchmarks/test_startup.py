@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from .utils import record, summarize
+
+STARTUP_RUNS = int(os.getenv("BENCH_STARTUP_RUNS", "5"))
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+{module}.{entry_point}
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import(module: str, entry_point: str) -> float:
+    script = STARTUP_SCRIPT.format(module=module, entry_point=entry_point)
+    output = subprocess.check_output(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        text=True,
+    )
+    return float(output)
+
+
+@pytest.mark.parametrize(
+    "module, entry_point", [("main", "create_app()"), ("asgi", "app")]
+)
+def test_app_import(module, entry_point):
+    samples = [measure_import(module, entry_point) for _ in range(STARTUP_RUNS)]
+    record(f"app_import[module={module}]", summarize(samples))
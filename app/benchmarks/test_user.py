@@ -0,0 +1,22 @@
+import pytest
+from tests.api_client import TodoApiClient
+from tests.constants import DEFAULT_USER_PASSWORD
+
+from .utils import BENCH_DURATION, BENCH_MODE, record, run_for, seed_todos, summarize
+
+
+@pytest.mark.parametrize("with_todos", [False, True])
+@pytest.mark.parametrize("todos", [0, 1000, 10000, 100000])
+def test_get_user_latency(bench_client_factory, todos, with_todos):
+    name = f"bench_get_user_{todos}_{with_todos}"
+    client = TodoApiClient(bench_client_factory(), verbose=False)
+    client.create_user(name, DEFAULT_USER_PASSWORD)
+    client.auth(name, DEFAULT_USER_PASSWORD)
+    seed_todos(client.get_user().id, todos)
+
+    samples = run_for(BENCH_DURATION, lambda: client.get_user(with_todos))
+    record(
+        f"get_user[todos={todos},with_todos={with_todos},mode={BENCH_MODE}]",
+        summarize(samples, BENCH_DURATION),
+    )
+    client.delete_user()
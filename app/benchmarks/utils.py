@@ -0,0 +1,141 @@
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from auth import hash_password
+from models import Session, Todo, Token, User
+from sqlalchemy import delete, insert, select, update
+from tests.conftest import APP_MODE
+
+BENCH_RESULTS = os.getenv("BENCH_RESULTS", "bench_results.json")
+BENCH_DURATION = float(os.getenv("BENCH_DURATION", "5"))
+BENCH_CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "4"))
+BENCH_SCALES = [int(scale) for scale in os.getenv("BENCH_SCALES", "1000").split(",")]
+BENCH_USERS = int(os.getenv("BENCH_USERS", "10"))
+BENCH_URL = os.getenv("BENCH_URL")
+BENCH_MODE = "remote" if BENCH_URL else APP_MODE
+BENCH_USER_PREFIX = "bench_"
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(samples: list[float], duration: float = None) -> dict:
+    result = {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+    }
+    if duration:
+        result["rps"] = len(samples) / duration
+    return result
+
+
+def run_for(duration: float, call: Callable) -> list[float]:
+    samples = []
+    deadline = time.perf_counter() + duration
+    while (start := time.perf_counter()) < deadline:
+        call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_concurrently(duration: float, concurrency: int, call: Callable) -> list[float]:
+    with ThreadPoolExecutor(concurrency) as executor:
+        jobs = [executor.submit(run_for, duration, call) for _ in range(concurrency)]
+        return [sample for job in jobs for sample in job.result()]
+
+
+def get_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record(name: str, result: dict):
+    results = {"meta": {}, "results": {}}
+    if os.path.exists(BENCH_RESULTS):
+        with open(BENCH_RESULTS) as file:
+            results = json.load(file)
+    results["meta"] = {
+        "revision": get_revision(),
+        "mode": BENCH_MODE,
+        "duration": BENCH_DURATION,
+        "concurrency": BENCH_CONCURRENCY,
+        "updated_at": datetime.datetime.now().isoformat(),
+    }
+    results["results"][name] = result
+    with open(BENCH_RESULTS, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    print(name, json.dumps(result, indent=2))
+
+
+def seed_todos(user_id: int, count: int, batch_size: int = 10000):
+    with Session() as session:
+        for offset in range(0, count, batch_size):
+            session.execute(
+                insert(Todo),
+                [
+                    {
+                        "user_id": user_id,
+                        "name": f"todo_{number}",
+                        "important": number % 3 == 0,
+                        "done": number % 2 == 0,
+                    }
+                    for number in range(offset, min(offset + batch_size, count))
+                ],
+            )
+        session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(
+                todo_count=User.todo_count + count,
+                done_count=User.done_count + (count + 1) // 2,
+                important_count=User.important_count + (count + 2) // 3,
+            )
+        )
+        session.commit()
+
+
+def seed_users(prefix: str, count: int, password: str) -> list[int]:
+    password = hash_password(password)
+    with Session() as session:
+        user_ids = session.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {"name": f"{prefix}_{number}", "password": password}
+                for number in range(count)
+            ],
+        ).all()
+        session.commit()
+    return user_ids
+
+
+def drop_users(user_ids: list[int]):
+    with Session() as session:
+        session.execute(delete(Todo).where(Todo.user_id.in_(user_ids)))
+        session.execute(delete(Token).where(Token.user_id.in_(user_ids)))
+        session.execute(delete(User).where(User.id.in_(user_ids)))
+        session.commit()
+
+
+def drop_bench_users():
+    with Session() as session:
+        user_ids = session.scalars(
+            select(User.id).where(User.name.startswith(BENCH_USER_PREFIX))
+        ).all()
+    if user_ids:
+        drop_users(user_ids)
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import asyncpg
+import orjson
+from config import (
+    CHANGE_FEED_BACKEND,
+    CHANGE_FEED_CHANNEL,
+    CHANGE_FEED_QUEUE_SIZE,
+    DB_URL,
+)
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._subscribers: dict[int, set] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int):
+        await self.start()
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(CHANGE_FEED_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(subscriber)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+    def dispatch(self, message: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(message["user_id"], ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, message)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, message: dict):
+        if not queue.full():
+            queue.put_nowait(message)
+
+    def close_subscribers(self):
+        with self._lock:
+            subscribers = [
+                subscriber
+                for user_subscribers in self._subscribers.values()
+                for subscriber in user_subscribers
+            ]
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._close, queue)
+
+    @staticmethod
+    def _close(queue: asyncio.Queue):
+        while queue.full():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def before_commit(self, session: Session, user_ids: set[int]):
+        pass
+
+    def after_commit(self, user_ids: set[int]):
+        for user_id in user_ids:
+            self.dispatch({"user_id": user_id})
+
+
+class PostgresChangeFeed(ChangeFeed):
+    def __init__(self, dsn: str, channel: str):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._connection = None
+        self._start_lock = None
+
+    async def start(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._connection is None or self._connection.is_closed():
+                self._connection = await asyncpg.connect(self.dsn)
+                self._connection.add_termination_listener(self.on_terminate)
+                await self._connection.add_listener(self.channel, self.on_notify)
+
+    async def stop(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            await connection.close()
+
+    def on_terminate(self, connection):
+        if connection is self._connection:
+            self._connection = None
+            self.close_subscribers()
+
+    def on_notify(self, connection, pid: int, channel: str, payload: str):
+        self.dispatch(orjson.loads(payload))
+
+    def before_commit(self, session: Session, user_ids: set[int]):
+        payloads = [
+            orjson.dumps({"user_id": user_id}).decode() for user_id in sorted(user_ids)
+        ]
+        session.execute(
+            text(
+                "SELECT pg_notify(:channel, payload)"
+                " FROM unnest(CAST(:payloads AS TEXT[])) AS payload"
+            ),
+            {"channel": self.channel, "payloads": payloads},
+        )
+
+    def after_commit(self, user_ids: set[int]):
+        pass
+
+
+def create_change_feed() -> ChangeFeed:
+    if CHANGE_FEED_BACKEND == "postgres":
+        return PostgresChangeFeed(DB_URL, CHANGE_FEED_CHANNEL)
+    return ChangeFeed()
+
+
+change_feed = create_change_feed()
@@ -5,3 +5,63 @@ POSTGRES_USER = os.getenv("POSTGRES_USER", "app")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "app")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "127.0.0.1")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
+POSTGRES_DSN = (
+    f"{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+)
+DB_URL = f"postgresql://{POSTGRES_DSN}"
+ASYNC_DB_URL = f"postgresql+asyncpg://{POSTGRES_DSN}"
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+DB_NULL_POOL = os.getenv("DB_NULL_POOL", "false").lower() == "true"
+DB_REPLICA_URLS = [url for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url]
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+DB_REPLICA_LSN_BACKEND = os.getenv("DB_REPLICA_LSN_BACKEND", "local")
+DB_REPLICA_LSN_SIZE = int(os.getenv("DB_REPLICA_LSN_SIZE", "100000"))
+DB_REPLICA_LSN_URL = os.getenv("DB_REPLICA_LSN_URL", "redis://localhost:6379/2")
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_CHANNEL = os.getenv("TOKEN_CACHE_CHANNEL", "token_revocations")
+TOKEN_CACHE_PING_INTERVAL = float(os.getenv("TOKEN_CACHE_PING_INTERVAL", "5"))
+TOKEN_TTL = int(os.getenv("TOKEN_TTL", str(7 * 24 * 3600)))
+TOKEN_REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL", "3600"))
+TOKEN_MAX_PER_USER = int(os.getenv("TOKEN_MAX_PER_USER", "20"))
+TOKEN_PRUNE_BATCH_SIZE = int(os.getenv("TOKEN_PRUNE_BATCH_SIZE", "1000"))
+
+TOMBSTONE_TTL = float(os.getenv("TOMBSTONE_TTL", str(30 * 24 * 3600)))
+TOMBSTONE_COMPACT_BATCH_SIZE = int(os.getenv("TOMBSTONE_COMPACT_BATCH_SIZE", "1000"))
+
+BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "5"))
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "local")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+
+CHANGE_FEED_BACKEND = os.getenv("CHANGE_FEED_BACKEND", "local")
+CHANGE_FEED_CHANNEL = os.getenv("CHANGE_FEED_CHANNEL", "todo_changes")
+CHANGE_FEED_KEEPALIVE = float(os.getenv("CHANGE_FEED_KEEPALIVE", "15"))
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "16"))
+
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local")
+RATE_LIMIT_SIZE = int(os.getenv("RATE_LIMIT_SIZE", "100000"))
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "redis://localhost:6379/1")
+
+COMPRESSION_ENCODINGS = [
+    encoding
+    for encoding in os.getenv("COMPRESSION_ENCODINGS", "br,gzip").split(",")
+    if encoding
+]
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
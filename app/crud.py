@@ -1,7 +1,61 @@
-import psycopg2
+import datetime
+from collections import Counter, defaultdict
+
+from auth import (
+    broadcast_revocation,
+    forget_tokens,
+    forget_user_tokens,
+    get_token_expiry,
+)
+from change_feed import change_feed
+from config import (
+    TOKEN_MAX_PER_USER,
+    TOKEN_PRUNE_BATCH_SIZE,
+    TOMBSTONE_COMPACT_BATCH_SIZE,
+    TOMBSTONE_TTL,
+)
 from errors import HttpError
-from models import MODEL, MODEL_TYPE, Session
+from models import (
+    MODEL,
+    MODEL_TYPE,
+    Session,
+    Todo,
+    TodoTombstone,
+    Token,
+    User,
+    leave_replica,
+    pin_primary_reads,
+)
+from psycopg2.errorcodes import FOREIGN_KEY_VIOLATION, UNIQUE_VIOLATION
+from response_cache import response_cache
+from schema import TODO_LIST_DEFAULT_LIMIT
+from sqlalchemy import (
+    CTE,
+    BigInteger,
+    FunctionFilter,
+    Insert,
+    Integer,
+    ScalarResult,
+    Select,
+    Text,
+    Update,
+    and_,
+    case,
+    cast,
+    column,
+    delete,
+    event,
+    func,
+    insert,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession
+
+EXPORT_BATCH_SIZE = 1000
 
 
 def get_item_by_id(model: MODEL_TYPE, item_id: int, session: Session) -> MODEL:
@@ -11,39 +65,620 @@ def get_item_by_id(model: MODEL_TYPE, item_id: int, session: Session) -> MODEL:
     return item
 
 
-def add_item(item: MODEL, session: Session) -> MODEL:
+def get_owner_id(item: MODEL) -> int | None:
+    if isinstance(item, Todo):
+        return item.user_id
+    if isinstance(item, User):
+        return item.id
+    return None
+
+
+def user_changed(user_id: int, session: Session):
+    session.info.setdefault("changed_users", set()).add(user_id)
+
+
+@event.listens_for(OrmSession, "before_commit")
+def publish_user_changes(session: Session):
+    if session.info.get("changed_users"):
+        change_feed.before_commit(session, session.info["changed_users"])
+
+
+@event.listens_for(OrmSession, "after_commit")
+def apply_user_changes(session: Session):
+    user_ids = session.info.pop("changed_users", None)
+    if not user_ids:
+        return
+    pin_primary_reads(session)
+    for user_id in user_ids:
+        response_cache.invalidate(user_id)
+    change_feed.after_commit(user_ids)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def discard_user_changes(session: Session):
+    session.info.pop("changed_users", None)
+
+
+def get_user_version(user_id: int, session: Session) -> int | None:
+    query = select(User.version).where(User.id == user_id)
+    version = session.scalar(query)
+    if version is None and leave_replica(session):
+        version = session.scalar(query)
+    return version
+
+
+def get_todo_counts(done, important, sign: int = 1) -> dict:
+    return {
+        "todo_count": sign,
+        "done_count": sign * done,
+        "important_count": sign * important,
+    }
+
+
+def get_count_values(users, counts: dict | None) -> dict:
+    values = {"version": users.c.version + 1}
+    for field, delta in (counts or {}).items():
+        values[field] = users.c[field] + delta
+    return values
+
+
+def bump_version(user_id: int | None, session: Session, counts: dict = None):
+    if user_id is not None:
+        users = User.__table__
+        session.execute(
+            update(users)
+            .where(users.c.id == user_id)
+            .values(get_count_values(users, counts))
+        )
+        user_changed(user_id, session)
+
+
+def get_user_summary(
+    user_id: int, session: Session, todos: bool = False
+) -> dict | None:
+    columns = [
+        User.id,
+        User.name,
+        User.todo_count,
+        User.done_count,
+        User.important_count,
+    ]
+    if todos:
+        columns.append(
+            select(func.array_agg(aggregate_order_by(Todo.id, Todo.id)))
+            .where(Todo.user_id == User.id)
+            .scalar_subquery()
+            .label("todos")
+        )
+    query = select(*columns).where(User.id == user_id)
+    row = session.execute(query).first()
+    if row is None and leave_replica(session):
+        row = session.execute(query).first()
+    if row is None:
+        return None
+    summary = {
+        "id": row.id,
+        "name": row.name,
+        "todo_counts": {
+            "total": row.todo_count,
+            "done": row.done_count,
+            "important": row.important_count,
+        },
+    }
+    if todos:
+        summary["todos"] = row.todos or []
+    return summary
+
+
+def get_todo_stats(
+    user_id: int,
+    session: Session,
+    since: datetime.datetime = None,
+    until: datetime.datetime = None,
+) -> dict:
+    finished = and_(Todo.done, Todo.finish_time.is_not(None))
+    duration = func.extract("epoch", Todo.finish_time - Todo.start_time)
+    query = select(
+        func.count(Todo.id).label("total"),
+        func.count(Todo.id).filter(Todo.done).label("done"),
+        func.count(Todo.id).filter(Todo.important).label("important"),
+        func.count(Todo.id).filter(Todo.done, Todo.important).label("important_done"),
+        FunctionFilter(
+            func.percentile_cont(0.5).within_group(duration), finished
+        ).label("p50"),
+        FunctionFilter(
+            func.percentile_cont(0.9).within_group(duration), finished
+        ).label("p90"),
+    ).where(Todo.user_id == user_id)
+    if since is not None:
+        query = query.where(Todo.start_time >= since)
+    if until is not None:
+        query = query.where(Todo.start_time < until)
+    row = session.execute(query).one()
+    return {
+        "todo_counts": {
+            "total": row.total,
+            "done": row.done,
+            "important": row.important,
+            "important_done": row.important_done,
+        },
+        "completion_rate": row.done / row.total if row.total else None,
+        "completion_seconds": {"median": row.p50, "p90": row.p90},
+    }
+
+
+def raise_integrity_error(err: IntegrityError, name: str, owner_id: int | None):
+    pgcode = getattr(err.orig, "pgcode", None)
+    if pgcode == UNIQUE_VIOLATION:
+        raise HttpError(409, f"{name} already exists")
+    if pgcode == FOREIGN_KEY_VIOLATION and owner_id is not None:
+        forget_user_tokens(owner_id)
+        raise HttpError(401, "invalid token")
+    raise err
+
+
+def add_item(item: MODEL, session: Session, counts: dict = None) -> MODEL:
+    owner_id = get_owner_id(item)
     try:
         session.add(item)
+        bump_version(owner_id, session, counts)
         session.commit()
     except IntegrityError as err:
-        if isinstance(err.orig, psycopg2.errors.UniqueViolation):
-            raise HttpError(409, f"{item.__class__.__name__} already exists")
-        else:
-            raise err
+        raise_integrity_error(err, item.__class__.__name__, owner_id)
     return item
 
 
 def create_item(model: MODEL_TYPE, payload: dict, session: Session) -> MODEL:
     item = model(**payload)
-    item = add_item(item, session)
+    counts = None
+    if isinstance(item, Todo):
+        counts = get_todo_counts(bool(item.done), bool(item.important))
+    item = add_item(item, session, counts)
     return item
 
 
 def delete_item(item: MODEL, session: Session):
+    if isinstance(item, User):
+        user_changed(item.id, session)
+        broadcast_revocation(session, user_id=item.id)
+    elif isinstance(item, Todo):
+        counts = get_todo_counts(item.done, item.important, -1)
+        bump_version(item.user_id, session, counts)
+        session.add(TodoTombstone(todo_id=item.id, user_id=item.user_id))
+    else:
+        bump_version(get_owner_id(item), session)
     session.delete(item)
     session.commit()
 
 
 def update_item(item: MODEL, payload: dict, session: Session) -> MODEL:
+    if isinstance(item, Todo):
+        update_owned_item(Todo, item.id, item.user_id, payload, session)
+        return item
     for field, value in payload.items():
         setattr(item, field, value)
     add_item(item, session)
     return item
 
 
+def get_owned_item_error(
+    model: MODEL_TYPE, item_id: int, session: Session
+) -> HttpError:
+    if session.scalar(select(model.id).where(model.id == item_id)) is None:
+        return HttpError(404, f"{model.__name__} not found")
+    return HttpError(403, "access denied")
+
+
+def bump_owner_version(changed: CTE, counts: dict = None) -> Update:
+    users = User.__table__
+    return (
+        update(users)
+        .where(users.c.id == changed.c.user_id)
+        .values(get_count_values(users, counts))
+        .returning(changed.c.id)
+    )
+
+
+def get_count_changes(changed: CTE) -> dict:
+    return {
+        f"{field}_count": cast(changed.c[field], Integer)
+        - cast(changed.c[f"old_{field}"], Integer)
+        for field in ("done", "important")
+    }
+
+
+def insert_tombstones(deleted: CTE) -> Insert:
+    return insert(TodoTombstone).from_select(
+        ["todo_id", "user_id"], select(deleted.c.id, deleted.c.user_id)
+    )
+
+
+def update_owned_item(
+    model: MODEL_TYPE, item_id: int, user_id: int, payload: dict, session: Session
+) -> int:
+    table = model.__table__
+    owned = (table.c.id == item_id, table.c.user_id == user_id)
+    if payload and model is Todo:
+        old = (
+            select(table.c.id, table.c.done, table.c.important)
+            .where(*owned)
+            .with_for_update()
+            .cte("old")
+        )
+        changed = (
+            update(table)
+            .where(table.c.id == old.c.id)
+            .values(payload)
+            .returning(
+                table.c.id,
+                table.c.user_id,
+                table.c.done,
+                table.c.important,
+                old.c.done.label("old_done"),
+                old.c.important.label("old_important"),
+            )
+            .cte("changed")
+        )
+        query = bump_owner_version(changed, get_count_changes(changed))
+    elif payload:
+        changed = (
+            update(table)
+            .where(*owned)
+            .values(payload)
+            .returning(table.c.id, table.c.user_id)
+            .cte("changed")
+        )
+        query = bump_owner_version(changed)
+    else:
+        query = select(table.c.id).where(*owned)
+    if session.scalar(query) is None:
+        raise get_owned_item_error(model, item_id, session)
+    if payload:
+        user_changed(user_id, session)
+    session.commit()
+    return item_id
+
+
+def delete_owned_item(
+    model: MODEL_TYPE, item_id: int, user_id: int, session: Session
+) -> int:
+    table = model.__table__
+    query = delete(table).where(table.c.id == item_id, table.c.user_id == user_id)
+    if model is Todo:
+        deleted = query.returning(
+            table.c.id, table.c.user_id, table.c.done, table.c.important
+        ).cte("deleted")
+        counts = get_todo_counts(
+            cast(deleted.c.done, Integer), cast(deleted.c.important, Integer), -1
+        )
+        query = bump_owner_version(deleted, counts).add_cte(
+            insert_tombstones(deleted).cte("tombstones")
+        )
+    else:
+        deleted = query.returning(table.c.id, table.c.user_id).cte("deleted")
+        query = bump_owner_version(deleted)
+    if session.scalar(query) is None:
+        raise get_owned_item_error(model, item_id, session)
+    user_changed(user_id, session)
+    session.commit()
+    return item_id
+
+
+def create_token(user_id: int, session: Session) -> dict:
+    token = session.execute(
+        insert(Token)
+        .values(user_id=user_id, expires_at=get_token_expiry())
+        .returning(Token.token, Token.expires_at)
+    ).one()
+    newest = (
+        select(Token.id)
+        .where(Token.user_id == user_id)
+        .order_by(Token.id.desc())
+        .limit(TOKEN_MAX_PER_USER)
+    )
+    revoked = session.scalars(
+        delete(Token)
+        .where(Token.user_id == user_id, Token.id.not_in(newest.scalar_subquery()))
+        .returning(Token.token)
+    ).all()
+    if revoked:
+        broadcast_revocation(session, tokens=revoked)
+    session.commit()
+    forget_tokens(revoked)
+    pin_primary_reads(session)
+    return {"token": token.token, "expires_at": token.expires_at}
+
+
+def revoke_tokens(user_id: int, session: Session, token_id: int = None) -> int:
+    query = delete(Token).where(Token.user_id == user_id)
+    if token_id is not None:
+        query = query.where(Token.id == token_id)
+    revoked = session.scalars(query.returning(Token.token)).all()
+    if revoked:
+        broadcast_revocation(session, tokens=revoked)
+    session.commit()
+    forget_tokens(revoked)
+    return len(revoked)
+
+
+def prune_expired_tokens(
+    session: Session, batch_size: int = TOKEN_PRUNE_BATCH_SIZE
+) -> int:
+    expired = (
+        select(Token.id)
+        .where(Token.expires_at <= func.now())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    total = 0
+    while True:
+        deleted = session.execute(
+            delete(Token).where(Token.id.in_(expired.scalar_subquery()))
+        ).rowcount
+        session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
 def update_item_by_id(
     model: MODEL_TYPE, item_id: int, payload: dict, session: Session
 ) -> MODEL:
     item = get_item_by_id(model, item_id, session)
     update_item(item, payload, session)
     return item
+
+
+def get_todo_list(
+    user_id: int,
+    session: Session,
+    limit: int = TODO_LIST_DEFAULT_LIMIT,
+    after: int = None,
+    offset: int = 0,
+    q: str = None,
+    done: bool = None,
+    important: bool = None,
+) -> list[Todo]:
+    query = select(Todo).where(Todo.user_id == user_id)
+    if after is not None:
+        query = query.where(Todo.id > after)
+    if done is not None:
+        query = query.where(Todo.done == done)
+    if important is not None:
+        query = query.where(Todo.important == important)
+    if q is None:
+        query = query.order_by(Todo.id)
+    else:
+        query = query.where(Todo.name.icontains(q, autoescape=True)).order_by(
+            *get_search_rank(q)
+        )
+    return session.scalars(query.offset(offset).limit(limit)).all()
+
+
+def get_sync_cursor(session: Session) -> int:
+    xmin = func.pg_snapshot_xmin(func.pg_current_snapshot())
+    return session.scalar(select(cast(cast(xmin, Text), BigInteger)))
+
+
+def get_todo_changes(user_id: int, session: Session, since: int) -> dict:
+    cursor = get_sync_cursor(session)
+    horizon = session.scalar(select(User.sync_horizon).where(User.id == user_id))
+    reset = since <= (horizon or 0)
+    todos = select(Todo).where(Todo.user_id == user_id)
+    deleted = []
+    if not reset:
+        todos = todos.where(Todo.change_seq >= since)
+        deleted = session.scalars(
+            select(TodoTombstone.todo_id).where(
+                TodoTombstone.user_id == user_id, TodoTombstone.change_seq >= since
+            )
+        ).all()
+    return {
+        "todos": [todo.dict for todo in session.scalars(todos.order_by(Todo.id))],
+        "deleted": deleted,
+        "cursor": cursor,
+        "reset": reset,
+    }
+
+
+def compact_tombstones(
+    session: Session,
+    older_than: float = TOMBSTONE_TTL,
+    batch_size: int = TOMBSTONE_COMPACT_BATCH_SIZE,
+) -> int:
+    users = User.__table__
+    expired = (
+        select(TodoTombstone.todo_id)
+        .where(
+            TodoTombstone.deleted_at
+            < func.now() - datetime.timedelta(seconds=older_than)
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    total = 0
+    while True:
+        deleted = (
+            delete(TodoTombstone)
+            .where(TodoTombstone.todo_id.in_(expired.scalar_subquery()))
+            .returning(TodoTombstone.user_id, TodoTombstone.change_seq)
+            .cte("deleted")
+        )
+        horizons = (
+            select(
+                deleted.c.user_id,
+                func.max(deleted.c.change_seq).label("change_seq"),
+                func.count().label("count"),
+            )
+            .group_by(deleted.c.user_id)
+            .subquery()
+        )
+        counts = session.scalars(
+            update(users)
+            .where(users.c.id == horizons.c.user_id)
+            .values(
+                sync_horizon=func.greatest(users.c.sync_horizon, horizons.c.change_seq),
+                version=users.c.version + 1,
+            )
+            .returning(horizons.c.count)
+        ).all()
+        session.commit()
+        total += sum(counts)
+        if sum(counts) < batch_size:
+            return total
+
+
+def get_search_rank(q: str) -> tuple:
+    match = case(
+        (func.lower(Todo.name) == q.lower(), 0),
+        (Todo.name.istartswith(q, autoescape=True), 1),
+        else_=2,
+    )
+    return match, func.length(Todo.name), Todo.id
+
+
+def get_next_page(query: dict, last_id: int) -> dict:
+    if "q" in query:
+        limit = query.get("limit", TODO_LIST_DEFAULT_LIMIT)
+        return {**query, "offset": query.get("offset", 0) + limit}
+    query = {key: value for key, value in query.items() if key != "offset"}
+    return {**query, "after": last_id}
+
+
+def stream_todos_query(user_id: int, batch_size: int = EXPORT_BATCH_SIZE) -> Select:
+    return (
+        select(Todo)
+        .where(Todo.user_id == user_id)
+        .order_by(Todo.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+
+def stream_todos(
+    user_id: int, session: Session, batch_size: int = EXPORT_BATCH_SIZE
+) -> ScalarResult[Todo]:
+    return session.scalars(stream_todos_query(user_id, batch_size))
+
+
+def get_bulk_results(
+    ids: list[int], done_ids: set[int], session: Session
+) -> list[dict]:
+    missing = set(ids) - done_ids
+    foreign = set()
+    if missing:
+        foreign = set(session.scalars(select(Todo.id).where(Todo.id.in_(missing))))
+    results = []
+    for item_id in ids:
+        if item_id in done_ids:
+            results.append({"id": item_id, "status": "ok"})
+        elif item_id in foreign:
+            results.append(
+                {"id": item_id, "status": "error", "description": "access denied"}
+            )
+        else:
+            results.append(
+                {"id": item_id, "status": "error", "description": "Todo not found"}
+            )
+    return results
+
+
+def bulk_create_todos(
+    user_id: int, items: list[dict], session: Session, counts: Counter
+) -> list[int]:
+    if not items:
+        return []
+    for item in items:
+        counts.update(get_todo_counts(item.get("done", False), item["important"]))
+    query = insert(Todo).returning(Todo.id, sort_by_parameter_order=True)
+    return session.scalars(
+        query, [{**item, "user_id": user_id} for item in items]
+    ).all()
+
+
+def bulk_update_todos(
+    user_id: int, items: list[dict], session: Session, counts: Counter
+) -> set[int]:
+    todos = Todo.__table__
+    groups = defaultdict(list)
+    for item in items:
+        groups[tuple(sorted(item))].append(item)
+    updated = set()
+    for fields, group in groups.items():
+        rows = values(
+            *(column(field, todos.c[field].type) for field in fields),
+            name="bulk_update",
+        ).data([tuple(item[field] for field in fields) for item in group])
+        changes = {field: rows.c[field] for field in fields if field != "id"}
+        if "done" in changes:
+            changes["finish_time"] = func.now()
+        old = (
+            select(todos.c.id, todos.c.done, todos.c.important)
+            .where(
+                todos.c.id.in_([item["id"] for item in group]),
+                todos.c.user_id == user_id,
+            )
+            .with_for_update()
+            .cte("old")
+        )
+        query = (
+            update(todos)
+            .where(todos.c.id == rows.c.id, todos.c.id == old.c.id)
+            .values(changes)
+            .returning(
+                todos.c.id,
+                todos.c.done,
+                todos.c.important,
+                old.c.done.label("old_done"),
+                old.c.important.label("old_important"),
+            )
+        )
+        for row in session.execute(query):
+            updated.add(row.id)
+            counts["done_count"] += row.done - row.old_done
+            counts["important_count"] += row.important - row.old_important
+    return updated
+
+
+def bulk_delete_todos(
+    user_id: int, ids: list[int], session: Session, counts: Counter
+) -> set[int]:
+    if not ids:
+        return set()
+    deleted = (
+        delete(Todo)
+        .where(Todo.id.in_(ids), Todo.user_id == user_id)
+        .returning(Todo.id, Todo.user_id, Todo.done, Todo.important)
+        .cte("deleted")
+    )
+    tombstones = (
+        insert_tombstones(deleted).returning(TodoTombstone.todo_id).cte("tombstones")
+    )
+    query = select(deleted.c.id, deleted.c.done, deleted.c.important).join(
+        tombstones, tombstones.c.todo_id == deleted.c.id
+    )
+    removed = set()
+    for row in session.execute(query):
+        removed.add(row.id)
+        counts.update(get_todo_counts(row.done, row.important, -1))
+    return removed
+
+
+def bulk_todos(user_id: int, payload: dict, session: Session) -> dict:
+    counts = Counter()
+    try:
+        created = bulk_create_todos(user_id, payload.get("create", []), session, counts)
+    except IntegrityError as err:
+        raise_integrity_error(err, "Todo", user_id)
+    updates = payload.get("update", [])
+    updated = bulk_update_todos(user_id, updates, session, counts)
+    deletes = payload.get("delete", [])
+    deleted = bulk_delete_todos(user_id, deletes, session, counts)
+    result = {
+        "create": [{"id": item_id, "status": "ok"} for item_id in created],
+        "update": get_bulk_results([item["id"] for item in updates], updated, session),
+        "delete": get_bulk_results(deletes, deleted, session),
+    }
+    if created or updated or deleted:
+        bump_version(user_id, session, counts)
+    session.commit()
+    return result
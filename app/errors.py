@@ -1,4 +1,10 @@
 class HttpError(Exception):
-    def __init__(self, status_code: int, description: dict | list | str):
+    def __init__(
+        self,
+        status_code: int,
+        description: dict | list | str,
+        headers: dict[str, str] | None = None,
+    ):
         self.status_code = status_code
         self.description = description
+        self.headers = headers or {}
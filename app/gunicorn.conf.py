@@ -0,0 +1,35 @@
+import os
+import shutil
+
+from gunicorn.glogging import CONFIG_DEFAULTS
+from prometheus_client import multiprocess
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+logconfig_dict = {
+    **CONFIG_DEFAULTS,
+    "loggers": {
+        **{
+            name: {**logger, "propagate": False}
+            for name, logger in CONFIG_DEFAULTS["loggers"].items()
+        },
+        "todo.timing": {
+            "level": os.getenv("TIMING_LOG_LEVEL", "INFO"),
+            "handlers": ["console"],
+            "propagate": False,
+        },
+    },
+}
+
+
+def on_starting(server):
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,59 +1,180 @@
+import logging
+import math
+import time
+
+import click
+from config import (
+    DB_REPLICA_STICKY_SECONDS,
+    SERVER_TIMING,
+    TOKEN_PRUNE_BATCH_SIZE,
+    TOMBSTONE_COMPACT_BATCH_SIZE,
+    TOMBSTONE_TTL,
+)
+from crud import compact_tombstones, prune_expired_tokens
 from errors import HttpError
-from flask import Response, request
-from models import Session
+from flask import Flask, Response, current_app, request
+from metrics import metrics_view, observe_request, start_request
+from migrations import init_db
+from models import READ_LSN_COOKIE, Session, get_read_lsn, get_replica_engine
+from rate_limit import check_rate_limits
+from read_lsn import read_lsn_store
+from response_compression import compress_response
+from timing import finish_timings, start_timings
 from tools import get_json_response, handle_error
-from views import LoginView, TodoView, UserView
+from views import (
+    LoginView,
+    TodoBulkView,
+    TodoExportView,
+    TodoStatsView,
+    TodoView,
+    UserView,
+)
 
-from app import get_app
+from app import build_app
 
 JSON_METHODS = frozenset({"POST", "PUT", "PATCH"})
-
-app = get_app()
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
 
 
-@app.errorhandler(404)
 def not_found(err):
     return get_json_response({"description": "url not found"}, 404)
 
 
-@app.errorhandler(500)
 def unexpected(err):
     msg = {"description": "unexpected error"}
-    if app.debug:
+    if current_app.debug:
         msg["error"] = str(err)
         msg["traceback"] = err.__traceback__
     return get_json_response(msg, 500)
 
 
-@app.before_request
 def before_requests():
-    request.session = Session()
+    start_request()
+    if SERVER_TIMING:
+        start_timings()
+    check_rate_limits(
+        request.endpoint,
+        {"ip": request.remote_addr, "token": request.headers.get("Authorization")},
+    )
+    replica = None
+    if request.method in SAFE_METHODS:
+        replica = get_replica_engine(get_client_read_lsn())
+    request.session = Session(replica=replica)
 
     if request.method in JSON_METHODS and not request.is_json:
         raise HttpError(400, "json format expected")
 
 
-@app.after_request
-def after_requests(response: Response):
-    request.session.close()
+def get_client_read_lsn() -> str | None:
+    read_lsn = request.cookies.get(READ_LSN_COOKIE)
+    token = request.headers.get("Authorization")
+    if read_lsn is None and token is not None:
+        read_lsn = read_lsn_store.get(token)
+    return read_lsn
+
+
+def set_read_lsn(response: Response) -> Response:
+    session = getattr(request, "session", None)
+    read_lsn = None if session is None else get_read_lsn(session)
+    if read_lsn is not None:
+        token = request.headers.get("Authorization")
+        if token is not None:
+            read_lsn_store.set(token, read_lsn)
+        response.set_cookie(
+            READ_LSN_COOKIE,
+            read_lsn,
+            max_age=math.ceil(DB_REPLICA_STICKY_SECONDS),
+            httponly=True,
+            samesite="Lax",
+        )
     return response
 
 
-user_view = UserView.as_view("user")
-todo_view = TodoView.as_view("todo")
-
-app.add_url_rule(
-    "/user", view_func=user_view, methods=["GET", "POST", "PATCH", "DELETE"]
-)
-
-app.add_url_rule("/login", view_func=LoginView.as_view("login"), methods=["POST"])
-
-app.add_url_rule("/todo", view_func=todo_view, methods=["POST", "GET"])
-app.add_url_rule(
-    "/todo/<int:todo_id>", view_func=todo_view, methods=["GET", "PATCH", "DELETE"]
-)
+def after_requests(response: Response):
+    response = set_read_lsn(response)
+    return observe_request(finish_timings(compress_response(response)))
+
+
+def teardown_requests(err):
+    session = getattr(request, "session", None)
+    if session is not None:
+        session.close()
+
+
+@click.command("init-db")
+def init_db_command():
+    init_db()
+
+
+@click.command("prune-tokens")
+@click.option("--batch-size", default=TOKEN_PRUNE_BATCH_SIZE, show_default=True)
+@click.option("--interval", default=0.0, help="Repeat every INTERVAL seconds.")
+def prune_tokens_command(batch_size: int, interval: float):
+    while True:
+        with Session() as session:
+            deleted = prune_expired_tokens(session, batch_size)
+        click.echo(f"pruned {deleted} expired tokens")
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+@click.command("compact-tombstones")
+@click.option("--older-than", default=TOMBSTONE_TTL, show_default=True)
+@click.option("--batch-size", default=TOMBSTONE_COMPACT_BATCH_SIZE, show_default=True)
+@click.option("--interval", default=0.0, help="Repeat every INTERVAL seconds.")
+def compact_tombstones_command(older_than: float, batch_size: int, interval: float):
+    while True:
+        with Session() as session:
+            deleted = compact_tombstones(session, older_than, batch_size)
+        click.echo(f"compacted {deleted} tombstones")
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+def create_app() -> Flask:
+    app = build_app()
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, unexpected)
+    app.register_error_handler(HttpError, handle_error)
+    app.before_request(before_requests)
+    app.after_request(after_requests)
+    app.teardown_request(teardown_requests)
+
+    user_view = UserView.as_view("user")
+    todo_view = TodoView.as_view("todo")
+
+    app.add_url_rule(
+        "/user", view_func=user_view, methods=["GET", "POST", "PATCH", "DELETE"]
+    )
+
+    app.add_url_rule(
+        "/login", view_func=LoginView.as_view("login"), methods=["POST", "DELETE"]
+    )
+
+    app.add_url_rule("/todo", view_func=todo_view, methods=["POST", "GET"])
+    app.add_url_rule(
+        "/todo/bulk", view_func=TodoBulkView.as_view("todo_bulk"), methods=["POST"]
+    )
+    app.add_url_rule(
+        "/todo/export", view_func=TodoExportView.as_view("todo_export"), methods=["GET"]
+    )
+    app.add_url_rule(
+        "/todo/stats", view_func=TodoStatsView.as_view("todo_stats"), methods=["GET"]
+    )
+    app.add_url_rule(
+        "/todo/<int:todo_id>", view_func=todo_view, methods=["GET", "PATCH", "DELETE"]
+    )
+
+    app.add_url_rule("/metrics", view_func=metrics_view, methods=["GET"])
+
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(prune_tokens_command)
+    app.cli.add_command(compact_tombstones_command)
+    return app
 
-app.register_error_handler(HttpError, handle_error)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    logging.basicConfig(level=logging.INFO)
+    create_app().run(debug=True)
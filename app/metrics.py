@@ -0,0 +1,93 @@
+import os
+import time
+
+from auth import token_cache
+from db_pool import get_pool_stats
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from response_cache import response_cache
+
+LABELS = ("view", "method", "status")
+
+REQUESTS = Counter("todo_requests_total", "HTTP requests", LABELS)
+REQUEST_LATENCY = Histogram(
+    "todo_request_duration_seconds", "HTTP request latency", LABELS
+)
+REQUEST_ERRORS = Counter("todo_request_errors_total", "HTTP 5xx responses", LABELS)
+HTTP_ERRORS = Counter("todo_http_errors_total", "HttpError raised", ("status",))
+POOL_CONNECTIONS = Gauge(
+    "todo_db_pool_connections",
+    "Database pool connections",
+    ("pool", "state"),
+    multiprocess_mode="livesum",
+)
+POOL_CHECKOUT_WAIT = Gauge(
+    "todo_db_pool_checkout_wait_max_seconds",
+    "Longest database pool checkout wait",
+    ("pool",),
+    multiprocess_mode="livemax",
+)
+TOKEN_CACHE = Gauge(
+    "todo_token_cache",
+    "Token cache counters",
+    ("stat",),
+    multiprocess_mode="livesum",
+)
+RESPONSE_CACHE = Gauge(
+    "todo_response_cache",
+    "Response cache counters",
+    ("stat",),
+    multiprocess_mode="livesum",
+)
+
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+
+
+def observe_request(response: Response) -> Response:
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return response
+    labels = (request.endpoint or "unknown", request.method, response.status_code)
+    REQUESTS.labels(*labels).inc()
+    REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - start)
+    if response.status_code >= 500:
+        REQUEST_ERRORS.labels(*labels).inc()
+    update_gauges()
+    return response
+
+
+def observe_http_error(status_code: int):
+    HTTP_ERRORS.labels(status_code).inc()
+
+
+def update_gauges():
+    for pool, stats in get_pool_stats().items():
+        for state in ("in_use", "idle", "overflow"):
+            if state in stats:
+                POOL_CONNECTIONS.labels(pool, state).set(stats[state])
+        POOL_CHECKOUT_WAIT.labels(pool).set(stats["wait_seconds_max"])
+    for stat, value in token_cache.stats.items():
+        TOKEN_CACHE.labels(stat).set(value)
+    for stat, value in response_cache.stats.items():
+        if stat != "hit_rate":
+            RESPONSE_CACHE.labels(stat).set(value)
+
+
+def metrics_view():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,138 @@
+from typing import Callable, NamedTuple
+
+from config import TOKEN_TTL
+from models import Base, extension_available, get_engine
+from sqlalchemy import Connection, Engine, text
+
+
+class AddColumn(NamedTuple):
+    table: str
+    column: str
+    definition: str
+    statements: tuple[str, ...] = ()
+
+
+class CreateIndex(NamedTuple):
+    name: str
+    definition: str
+    condition: Callable[[Connection], bool] | None = None
+
+
+COLUMNS = [
+    AddColumn("todo_user", "version", "integer DEFAULT 0 NOT NULL"),
+    AddColumn("todo_user", "sync_horizon", "bigint DEFAULT 0 NOT NULL"),
+    AddColumn("todo_user", "todo_count", "integer DEFAULT 0 NOT NULL"),
+    AddColumn("todo_user", "done_count", "integer DEFAULT 0 NOT NULL"),
+    AddColumn(
+        "todo_user",
+        "important_count",
+        "integer DEFAULT 0 NOT NULL",
+        (
+            "UPDATE todo_user SET todo_count = counts.total, done_count = counts.done,"
+            " important_count = counts.important FROM (SELECT user_id,"
+            " count(*) AS total, count(*) FILTER (WHERE done) AS done,"
+            " count(*) FILTER (WHERE important) AS important"
+            " FROM todo GROUP BY user_id) AS counts"
+            " WHERE todo_user.id = counts.user_id",
+        ),
+    ),
+    AddColumn(
+        "token",
+        "expires_at",
+        "timestamp with time zone",
+        (
+            "UPDATE token SET expires_at = now() + make_interval(secs => :token_ttl)",
+            "ALTER TABLE token ALTER COLUMN expires_at SET NOT NULL",
+        ),
+    ),
+    AddColumn(
+        "todo", "updated_at", "timestamp without time zone DEFAULT now() NOT NULL"
+    ),
+    AddColumn(
+        "todo",
+        "change_seq",
+        "bigint DEFAULT 0 NOT NULL",
+        (
+            "ALTER TABLE todo ALTER COLUMN change_seq"
+            " SET DEFAULT CAST(CAST(pg_current_xact_id() AS TEXT) AS BIGINT)",
+        ),
+    ),
+]
+
+INDEXES = [
+    CreateIndex("ix_token_user_id_id", "token (user_id, id)"),
+    CreateIndex("ix_token_expires_at", "token (expires_at)"),
+    CreateIndex("ix_todo_user_id_id", "todo (user_id, id) INCLUDE (done, important)"),
+    CreateIndex("ix_todo_user_id_change_seq", "todo (user_id, change_seq)"),
+    CreateIndex(
+        "ix_todo_name_trgm",
+        "todo USING gin (name gin_trgm_ops)",
+        lambda connection: create_extension(connection, "pg_trgm"),
+    ),
+]
+
+
+def create_extension(connection: Connection, name: str) -> bool:
+    if not extension_available(connection, name):
+        return False
+    connection.execute(text(f"CREATE EXTENSION IF NOT EXISTS {name}"))
+    return True
+
+
+def column_exists(connection: Connection, table: str, column: str) -> bool:
+    query = text(
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema()"
+        " AND table_name = :table AND column_name = :column"
+    )
+    return connection.scalar(query, {"table": table, "column": column}) is not None
+
+
+def add_columns(connection: Connection):
+    for migration in COLUMNS:
+        if column_exists(connection, migration.table, migration.column):
+            continue
+        connection.execute(
+            text(
+                f"ALTER TABLE {migration.table} ADD COLUMN IF NOT EXISTS"
+                f" {migration.column} {migration.definition}"
+            )
+        )
+        for statement in migration.statements:
+            connection.execute(text(statement), {"token_ttl": TOKEN_TTL})
+
+
+def drop_invalid_index(connection: Connection, name: str):
+    query = text(
+        "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid"
+        " WHERE pg_class.relname = :name"
+        " AND pg_class.relnamespace = current_schema()::regnamespace"
+        " AND NOT pg_index.indisvalid"
+    )
+    if connection.scalar(query, {"name": name}) is not None:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def create_indexes(connection: Connection):
+    for index in INDEXES:
+        if index.condition is not None and not index.condition(connection):
+            continue
+        drop_invalid_index(connection, index.name)
+        connection.execute(
+            text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name}"
+                f" ON {index.definition}"
+            )
+        )
+
+
+def migrate(engine: Engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        add_columns(connection)
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        create_indexes(connection)
+
+
+def init_db():
+    migrate(get_engine())
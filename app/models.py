@@ -1,27 +1,128 @@
 import datetime
+import itertools
+import re
 import uuid
+from functools import cache
 from typing import List, Type
 
-from config import (
-    POSTGRES_DB,
-    POSTGRES_HOST,
-    POSTGRES_PASSWORD,
-    POSTGRES_PORT,
-    POSTGRES_USER,
-)
-from sqlalchemy import UUID, Boolean, DateTime, ForeignKey, String, create_engine, func
-from sqlalchemy.orm import (
-    DeclarativeBase,
-    Mapped,
-    mapped_column,
-    relationship,
-    sessionmaker,
+from config import DB_REPLICA_URLS, DB_URL
+from db_pool import get_pool_options, track_pool
+from sqlalchemy import (
+    DDL,
+    UUID,
+    BigInteger,
+    Boolean,
+    Connection,
+    DateTime,
+    Engine,
+    ForeignKey,
+    Index,
+    Integer,
+    Select,
+    String,
+    Text,
+    cast,
+    create_engine,
+    event,
+    func,
+    text,
 )
+from sqlalchemy.orm import DeclarativeBase, Mapped
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.orm import mapped_column, relationship, sessionmaker
 
-engine = create_engine(
-    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}",
-)
-Session = sessionmaker(bind=engine)
+
+def extension_available(bind: Connection, name: str) -> bool:
+    query = text("SELECT 1 FROM pg_available_extensions WHERE name = :name")
+    return bind.scalar(query, {"name": name}) is not None
+
+
+def has_pg_trgm(ddl, target, bind: Connection | None, **kwargs) -> bool:
+    return bind is None or extension_available(bind, "pg_trgm")
+
+
+def current_xid():
+    return cast(cast(func.pg_current_xact_id(), Text), BigInteger)
+
+
+@cache
+def get_engine() -> Engine:
+    engine = create_engine(DB_URL, **get_pool_options())
+    track_pool(engine, "primary")
+    return engine
+
+
+@cache
+def get_replica_engines() -> list[Engine]:
+    engines = []
+    for number, url in enumerate(DB_REPLICA_URLS):
+        engine = create_engine(url, **get_pool_options())
+        track_pool(engine, f"replica_{number}")
+        engines.append(engine)
+    return engines
+
+
+replica_counter = itertools.count()
+READ_LSN_COOKIE = "read_lsn"
+LSN_PATTERN = re.compile(r"[0-9A-F]{1,8}/[0-9A-F]{1,8}")
+
+
+def replica_caught_up(engine: Engine, lsn: str) -> bool:
+    query = text(
+        "SELECT coalesce(pg_last_wal_replay_lsn(), pg_current_wal_lsn())"
+        " >= CAST(:lsn AS pg_lsn)"
+    )
+    with engine.connect() as connection:
+        return connection.scalar(query, {"lsn": lsn})
+
+
+def get_replica_engine(read_lsn: str = None) -> Engine | None:
+    engines = get_replica_engines()
+    if not engines:
+        return None
+    engine = engines[next(replica_counter) % len(engines)]
+    if read_lsn and LSN_PATTERN.fullmatch(read_lsn):
+        if not replica_caught_up(engine, read_lsn):
+            return None
+    return engine
+
+
+def pin_primary_reads(session: OrmSession):
+    session.info["pin_primary_reads"] = True
+
+
+def leave_replica(session: OrmSession) -> bool:
+    if getattr(session, "replica", None) is None:
+        return False
+    session.replica = None
+    return True
+
+
+def get_read_lsn(session: OrmSession) -> str | None:
+    if not session.info.get("pin_primary_reads") or not get_replica_engines():
+        return None
+    return session.scalar(text("SELECT CAST(pg_current_wal_lsn() AS TEXT)"))
+
+
+class LazyEngineSession(OrmSession):
+    def __init__(self, *args, replica: Engine = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = replica
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            self.replica is not None
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+            and mapper not in (Token, Token.__mapper__)
+        ):
+            return self.replica
+        if self.bind is None:
+            self.bind = get_engine()
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+Session = sessionmaker(class_=LazyEngineSession)
 
 
 class Base(DeclarativeBase):
@@ -36,6 +137,11 @@ class User(Base):
         String(50), unique=True, index=True, nullable=False
     )
     password: Mapped[str] = mapped_column(String(70), nullable=False)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    sync_horizon: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+    todo_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    done_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    important_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     tokens: Mapped[List["Token"]] = relationship(
         "Token", back_populates="user", cascade="all, delete-orphan"
     )
@@ -43,31 +149,50 @@ class User(Base):
         "Todo", back_populates="user", cascade="all, delete-orphan"
     )
 
-    @property
-    def dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "todos": [todo.id for todo in self.todos],
-        }
-
 
 class Token(Base):
     __tablename__ = "token"
+    __table_args__ = (
+        Index("ix_token_user_id_id", "user_id", "id"),
+        Index("ix_token_expires_at", "expires_at"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     token: Mapped[uuid.UUID] = mapped_column(
         UUID, server_default=func.gen_random_uuid(), unique=True
     )
+    expires_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
     user_id: Mapped[int] = mapped_column(ForeignKey("todo_user.id"))
     user: Mapped[User] = relationship(User, back_populates="tokens")
 
     @property
     def dict(self):
-        return {"id": self.id, "token": self.token, "user_id": self.user_id}
+        return {
+            "id": self.id,
+            "token": self.token,
+            "expires_at": self.expires_at,
+            "user_id": self.user_id,
+        }
 
 
 class Todo(Base):
     __tablename__ = "todo"
+    __table_args__ = (
+        Index(
+            "ix_todo_user_id_id",
+            "user_id",
+            "id",
+            postgresql_include=["done", "important"],
+        ),
+        Index("ix_todo_user_id_change_seq", "user_id", "change_seq"),
+        Index(
+            "ix_todo_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(callable_=has_pg_trgm),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     important: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -76,6 +201,12 @@ class Todo(Base):
         DateTime, server_default=func.now()
     )
     finish_time: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger, server_default=current_xid(), onupdate=current_xid()
+    )
 
     user_id: Mapped[int] = mapped_column(ForeignKey("todo_user.id"))
     user: Mapped[User] = relationship(User, back_populates="todos")
@@ -87,13 +218,32 @@ class Todo(Base):
             "name": self.name,
             "important": self.important,
             "done": self.done,
-            "start_time": self.start_time.isoformat() if self.start_time else None,
-            "finish_time": self.finish_time.isoformat() if self.finish_time else None,
+            "start_time": self.start_time,
+            "finish_time": self.finish_time,
+            "updated_at": self.updated_at,
             "user_id": self.user_id,
         }
 
 
+class TodoTombstone(Base):
+    __tablename__ = "todo_tombstone"
+    __table_args__ = (
+        Index("ix_todo_tombstone_user_id_change_seq", "user_id", "change_seq"),
+        Index("ix_todo_tombstone_deleted_at", "deleted_at"),
+    )
+    todo_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("todo_user.id", ondelete="CASCADE"))
+    change_seq: Mapped[int] = mapped_column(BigInteger, server_default=current_xid())
+    deleted_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, server_default=func.now()
+    )
+
+
 MODEL_TYPE = Type[User | Token | Todo]
 MODEL = User | Token | Todo
 
-Base.metadata.create_all(bind=engine)
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(callable_=has_pg_trgm),
+)
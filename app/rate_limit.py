@@ -0,0 +1,141 @@
+import abc
+import hashlib
+import math
+import threading
+import time
+from typing import NamedTuple
+
+from cache import TTLCache
+from config import RATE_LIMIT_BACKEND, RATE_LIMIT_SIZE, RATE_LIMIT_URL, RATE_LIMITS
+from errors import HttpError
+
+RATE_LIMIT_KEYS = frozenset({"ip", "token"})
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate))
+return tostring(retry_after)
+"""
+
+
+class RateLimit(NamedTuple):
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_rate_limits(spec: str) -> dict[str, list[tuple[str, RateLimit]]]:
+    limits = {}
+    for rule in filter(None, (rule.strip() for rule in spec.split(","))):
+        target, value = rule.split("=")
+        endpoint, key = target.split(":")
+        if key not in RATE_LIMIT_KEYS:
+            raise ValueError(f"unknown rate limit key {key!r} in {rule!r}")
+        capacity, period = value.split("/")
+        limits.setdefault(endpoint, []).append(
+            (key, RateLimit(int(capacity), float(period)))
+        )
+    return limits
+
+
+def take_token(
+    limit: RateLimit, tokens: float, updated: float, now: float
+) -> tuple[float, float]:
+    tokens = min(limit.capacity, tokens + max(0.0, now - updated) * limit.rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / limit.rate
+
+
+class RateLimiter(abc.ABC):
+    @abc.abstractmethod
+    def acquire(self, key: str, limit: RateLimit) -> float:
+        pass
+
+    def clear(self):
+        pass
+
+
+class LocalRateLimiter(RateLimiter):
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: dict[RateLimit, TTLCache] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, limit: RateLimit) -> float:
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets.get(limit)
+            if buckets is None:
+                buckets = self._buckets[limit] = TTLCache(self.maxsize, limit.period)
+            tokens, updated = buckets.get(key, (limit.capacity, now))
+            tokens, retry_after = take_token(limit, tokens, updated, now)
+            buckets.set(key, (tokens, now))
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisRateLimiter(RateLimiter):
+    def __init__(self, client):
+        self.client = client
+
+    def acquire(self, key: str, limit: RateLimit) -> float:
+        retry_after = self.client.eval(
+            TOKEN_BUCKET_SCRIPT,
+            1,
+            f"todo:rate:{key}",
+            limit.capacity,
+            repr(limit.rate),
+            repr(time.time()),
+        )
+        return float(retry_after)
+
+
+def create_rate_limiter() -> RateLimiter:
+    if RATE_LIMIT_BACKEND == "redis":
+        import redis
+
+        return RedisRateLimiter(redis.Redis.from_url(RATE_LIMIT_URL))
+    return LocalRateLimiter(RATE_LIMIT_SIZE)
+
+
+rate_limits = parse_rate_limits(RATE_LIMITS)
+rate_limiter = create_rate_limiter()
+
+
+def get_bucket_key(endpoint: str, key: str, value: str) -> str:
+    digest = hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+    return f"{endpoint}:{key}:{digest}"
+
+
+def check_rate_limits(endpoint: str | None, keys: dict[str, str | None]):
+    for key, limit in rate_limits.get(endpoint, ()):
+        value = keys.get(key)
+        if value is None:
+            continue
+        retry_after = rate_limiter.acquire(get_bucket_key(endpoint, key, value), limit)
+        if retry_after:
+            raise HttpError(
+                429,
+                "too many requests",
+                {"Retry-After": str(math.ceil(retry_after))},
+            )
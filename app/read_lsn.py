@@ -0,0 +1,69 @@
+import abc
+import hashlib
+import math
+
+from cache import TTLCache
+from config import (
+    DB_REPLICA_LSN_BACKEND,
+    DB_REPLICA_LSN_SIZE,
+    DB_REPLICA_LSN_URL,
+    DB_REPLICA_STICKY_SECONDS,
+)
+
+
+class ReadLsnStore(abc.ABC):
+    @abc.abstractmethod
+    def get(self, token: str) -> str | None:
+        pass
+
+    @abc.abstractmethod
+    def set(self, token: str, read_lsn: str):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LocalReadLsnStore(ReadLsnStore):
+    def __init__(self, maxsize: int, ttl: float):
+        self._tokens = TTLCache(maxsize, ttl)
+
+    def get(self, token: str) -> str | None:
+        return self._tokens.get(token)
+
+    def set(self, token: str, read_lsn: str):
+        self._tokens.set(token, read_lsn)
+
+    def clear(self):
+        self._tokens.clear()
+
+
+class RedisReadLsnStore(ReadLsnStore):
+    def __init__(self, client, ttl: float):
+        self.client = client
+        self.ttl = math.ceil(ttl)
+
+    @staticmethod
+    def get_name(token: str) -> str:
+        digest = hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+        return f"todo:read_lsn:{digest}"
+
+    def get(self, token: str) -> str | None:
+        read_lsn = self.client.get(self.get_name(token))
+        return None if read_lsn is None else read_lsn.decode()
+
+    def set(self, token: str, read_lsn: str):
+        self.client.set(self.get_name(token), read_lsn, ex=self.ttl)
+
+
+def create_read_lsn_store() -> ReadLsnStore:
+    if DB_REPLICA_LSN_BACKEND == "redis":
+        import redis
+
+        return RedisReadLsnStore(
+            redis.Redis.from_url(DB_REPLICA_LSN_URL), DB_REPLICA_STICKY_SECONDS
+        )
+    return LocalReadLsnStore(DB_REPLICA_LSN_SIZE, DB_REPLICA_STICKY_SECONDS)
+
+
+read_lsn_store = create_read_lsn_store()
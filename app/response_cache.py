@@ -0,0 +1,144 @@
+import abc
+from typing import NamedTuple
+
+import orjson
+from cache import TTLCache
+from config import (
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_URL,
+)
+
+RESPONSE_CACHE_USER_ENTRIES = 64
+CACHED_HEADERS = ("Link",)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: dict[str, str]
+
+    def encode(self) -> bytes:
+        return orjson.dumps(self.headers) + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, data: bytes) -> "CachedResponse":
+        headers, body = data.split(b"\n", 1)
+        return cls(body, orjson.loads(headers))
+
+
+def get_cache_key(path: str, query: str) -> str:
+    return f"{path}?{query}"
+
+
+class ResponseCache(abc.ABC):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, version: int, key: str) -> CachedResponse | None:
+        response = self.load(user_id, version, key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    @abc.abstractmethod
+    def load(self, user_id: int, version: int, key: str) -> CachedResponse | None:
+        pass
+
+    @abc.abstractmethod
+    def set(self, user_id: int, version: int, key: str, response: CachedResponse):
+        pass
+
+    @abc.abstractmethod
+    def invalidate(self, user_id: int):
+        pass
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class LocalResponseCache(ResponseCache):
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__()
+        self._users = TTLCache(maxsize, ttl)
+
+    def load(self, user_id: int, version: int, key: str) -> CachedResponse | None:
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1].get(key)
+
+    def set(self, user_id: int, version: int, key: str, response: CachedResponse):
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] < version:
+            entry = (version, {})
+        elif entry[0] > version:
+            return
+        responses = entry[1]
+        if key in responses or len(responses) < RESPONSE_CACHE_USER_ENTRIES:
+            responses[key] = response
+            self._users.set(user_id, entry)
+
+    def invalidate(self, user_id: int):
+        self._users.pop(user_id)
+
+    def clear(self):
+        super().clear()
+        self._users.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {**super().stats, "size": len(self._users)}
+
+
+class RedisResponseCache(ResponseCache):
+    def __init__(self, client, ttl: float):
+        super().__init__()
+        self.client = client
+        self.ttl = int(ttl)
+
+    @staticmethod
+    def get_name(user_id: int) -> str:
+        return f"todo:responses:{user_id}"
+
+    def load(self, user_id: int, version: int, key: str) -> CachedResponse | None:
+        data = self.client.hget(self.get_name(user_id), f"{version}:{key}")
+        return None if data is None else CachedResponse.decode(data)
+
+    def set(self, user_id: int, version: int, key: str, response: CachedResponse):
+        name = self.get_name(user_id)
+        self.client.hset(name, f"{version}:{key}", response.encode())
+        self.client.expire(name, self.ttl)
+
+    def invalidate(self, user_id: int):
+        self.client.delete(self.get_name(user_id))
+
+
+def create_response_cache() -> ResponseCache:
+    if RESPONSE_CACHE_BACKEND == "redis":
+        import redis
+
+        return RedisResponseCache(
+            redis.Redis.from_url(RESPONSE_CACHE_URL), RESPONSE_CACHE_TTL
+        )
+    return LocalResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+response_cache = create_response_cache()
+
+
+def get_cached_headers(headers) -> dict[str, str]:
+    return {name: headers[name] for name in CACHED_HEADERS if name in headers}
@@ -0,0 +1,85 @@
+import gzip
+import zlib
+from typing import Callable, Iterable, Iterator
+
+from config import (
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_ENCODINGS,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MIN_SIZE,
+)
+from flask import Response, request
+from timing import timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STREAM_BUFFER_SIZE = 4 * 1024
+
+ENCODINGS = [
+    encoding
+    for encoding in COMPRESSION_ENCODINGS
+    if encoding == "gzip" or (encoding == "br" and brotli is not None)
+]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def get_compressor(
+    encoding: str,
+) -> tuple[Callable[[bytes], bytes], Callable[[], bytes], Callable[[], bytes]]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    process, flush, finish = get_compressor(encoding)
+    buffer, size = [], 0
+    try:
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_BUFFER_SIZE:
+                yield process(b"".join(buffer)) + flush()
+                buffer, size = [], 0
+        yield process(b"".join(buffer)) + finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def compress_response(response: Response) -> Response:
+    if (
+        not ENCODINGS
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    elif (response.content_length or 0) < COMPRESSION_MIN_SIZE:
+        return response
+    else:
+        with timed("compress"):
+            response.set_data(compress(response.get_data(), encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -1,6 +1,7 @@
 import abc
+import datetime
 import re
-from typing import Optional, Type
+from typing import List, Optional, Type
 
 import pydantic
 
@@ -9,6 +10,10 @@ PASSWORD_UPPERCASE = re.compile(r"[A-Z]")
 PASSWORD_DIGITS = re.compile(r"[0-9]")
 PASSWORD_MIN_LENGTHS = 8
 PASSWORD_MAX_LENGTH = 32
+TODO_LIST_DEFAULT_LIMIT = 100
+TODO_LIST_MAX_LIMIT = 1000
+TODO_SEARCH_MAX_LENGTH = 50
+TODO_BULK_MAX_ITEMS = 1000
 
 
 class AbstractUser(pydantic.BaseModel, abc.ABC):
@@ -51,4 +56,86 @@ class UpdateTodo(pydantic.BaseModel):
     done: Optional[bool] = None
 
 
-SCHEMA_MODEL = Type[Login | CreateUser | PatchUser]
+class BulkUpdateTodo(pydantic.BaseModel):
+    id: int
+    name: Optional[str] = None
+    important: Optional[bool] = None
+    done: Optional[bool] = None
+
+    @pydantic.field_validator("name", "important", "done")
+    @classmethod
+    def not_null(cls, v):
+        if v is None:
+            raise ValueError("Value must not be null")
+        return v
+
+    @pydantic.model_validator(mode="after")
+    def has_changes(self) -> "BulkUpdateTodo":
+        if not self.model_fields_set - {"id"}:
+            raise ValueError(f"Todo {self.id} has no fields to update")
+        return self
+
+
+class BulkTodo(pydantic.BaseModel):
+    create: List[CreateTodo] = pydantic.Field([], max_length=TODO_BULK_MAX_ITEMS)
+    update: List[BulkUpdateTodo] = pydantic.Field([], max_length=TODO_BULK_MAX_ITEMS)
+    delete: List[int] = pydantic.Field([], max_length=TODO_BULK_MAX_ITEMS)
+
+    @pydantic.field_validator("update")
+    @classmethod
+    def unique_update_ids(cls, v: List[BulkUpdateTodo]) -> List[BulkUpdateTodo]:
+        ids = set()
+        for item in v:
+            if item.id in ids:
+                raise ValueError(f"Todo {item.id} is updated more than once")
+            ids.add(item.id)
+        return v
+
+    @pydantic.field_validator("delete")
+    @classmethod
+    def unique_delete_ids(cls, v: List[int]) -> List[int]:
+        ids = set()
+        for item_id in v:
+            if item_id in ids:
+                raise ValueError(f"Todo {item_id} is deleted more than once")
+            ids.add(item_id)
+        return v
+
+
+class LogoutQuery(pydantic.BaseModel):
+    all: bool = False
+
+
+class UserQuery(pydantic.BaseModel):
+    todos: bool = False
+
+
+class TodoListQuery(pydantic.BaseModel):
+    limit: int = pydantic.Field(TODO_LIST_DEFAULT_LIMIT, ge=1, le=TODO_LIST_MAX_LIMIT)
+    after: Optional[int] = None
+    offset: int = pydantic.Field(0, ge=0)
+    since: Optional[int] = pydantic.Field(None, ge=0)
+    q: Optional[str] = pydantic.Field(
+        None, min_length=1, max_length=TODO_SEARCH_MAX_LENGTH
+    )
+    done: Optional[bool] = None
+    important: Optional[bool] = None
+
+
+class TodoStatsQuery(pydantic.BaseModel):
+    since: Optional[datetime.datetime] = None
+    until: Optional[datetime.datetime] = None
+
+
+SCHEMA_MODEL = Type[
+    Login
+    | LogoutQuery
+    | CreateUser
+    | PatchUser
+    | CreateTodo
+    | UpdateTodo
+    | BulkTodo
+    | UserQuery
+    | TodoListQuery
+    | TodoStatsQuery
+]
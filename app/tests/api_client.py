@@ -1,3 +1,4 @@
+import json
 import os
 from typing import List, Literal, NamedTuple, Optional, Tuple
 
@@ -9,9 +10,10 @@ RESPONSE_TYPE = Optional[Literal["json", "text"]]
 
 
 class HttpError(Exception):
-    def __init__(self, status_code: int, description: str):
+    def __init__(self, status_code: int, description: str, headers: dict = None):
         self.status_code = status_code
         self.description = description
+        self.headers = headers or {}
 
     def __str__(self):
         return f"{self.status_code=}\n{self.description=}"
@@ -27,16 +29,24 @@ class AbstractStatusResponse(NamedTuple):
 
 class TokenResponse(NamedTuple):
     token: str
+    expires_at: str
 
 
 class CreateUserResponse(AbstractIdResponse):
     pass
 
 
+class TodoCounts(NamedTuple):
+    total: int
+    done: int
+    important: int
+
+
 class GetUserResponse(NamedTuple):
     id: int
     name: str
-    todos: List[int]
+    todo_counts: TodoCounts
+    todos: List[int] = None
 
 
 class UpdateUserResponse(AbstractIdResponse):
@@ -47,6 +57,10 @@ class DeleteUserResponse(AbstractStatusResponse):
     pass
 
 
+class LogoutResponse(AbstractStatusResponse):
+    pass
+
+
 class CreateTodoResponse(AbstractIdResponse):
     pass
 
@@ -59,6 +73,7 @@ class TodoItem(NamedTuple):
     done: bool
     start_time: str
     finish_time: str
+    updated_at: str
 
 
 class GetTodoResponse(TodoItem):
@@ -68,18 +83,56 @@ class GetTodoResponse(TodoItem):
 GetTodoListResponse = Tuple[TodoItem]
 
 
+class TodoChangesResponse(NamedTuple):
+    todos: GetTodoListResponse
+    deleted: List[int]
+    cursor: int
+    reset: bool
+
+
+class TodoStatsCounts(NamedTuple):
+    total: int
+    done: int
+    important: int
+    important_done: int
+
+
+class CompletionSeconds(NamedTuple):
+    median: float | None
+    p90: float | None
+
+
+class TodoStatsResponse(NamedTuple):
+    todo_counts: TodoStatsCounts
+    completion_rate: float | None
+    completion_seconds: CompletionSeconds
+
+
 class UpdateTodoResponse(AbstractIdResponse):
     pass
 
 
-class DeleteTodoResponse(AbstractIdResponse):
+class DeleteTodoResponse(AbstractStatusResponse):
     pass
 
 
+class BulkItemResult(NamedTuple):
+    id: int
+    status: str
+    description: str = None
+
+
+class BulkTodoResponse(NamedTuple):
+    create: List[BulkItemResult]
+    update: List[BulkItemResult]
+    delete: List[BulkItemResult]
+
+
 class TodoApiClient:
-    def __init__(self, test_client: FlaskClient):
+    def __init__(self, test_client: FlaskClient, verbose: bool = True):
         self.client = test_client
         self.headers = {}
+        self.verbose = verbose
 
     def _call(
         self,
@@ -98,10 +151,11 @@ class TodoApiClient:
         # response = self.session.request(
         #     http_method, f"{self.base_url}/{api_method}", json=json, **kwargs
         # )
-        print(response.text, response.status_code)
+        if self.verbose:
+            print(response.text, response.status_code)
 
         if response.status_code >= 400:
-            raise HttpError(response.status_code, response.text)
+            raise HttpError(response.status_code, response.text, dict(response.headers))
 
         if response_type is not None:
             response = getattr(response, response_type)
@@ -118,13 +172,20 @@ class TodoApiClient:
         token = self.login(name, password).token
         self.headers["Authorization"] = token
 
+    def logout(self, all: bool = False) -> LogoutResponse:
+        query = {"all": True} if all else {}
+        return LogoutResponse(**self._call("DELETE", "/login", query_string=query))
+
     def create_user(self, name: str, password: str) -> CreateUserResponse:
         return CreateUserResponse(
             **self._call("POST", "/user", json={"name": name, "password": password})
         )
 
-    def get_user(self) -> GetUserResponse:
-        return GetUserResponse(**self._call("GET", "/user"))
+    def get_user(self, with_todos: bool = False) -> GetUserResponse:
+        query = {"todos": True} if with_todos else {}
+        user = self._call("GET", "/user", query_string=query)
+        user["todo_counts"] = TodoCounts(**user["todo_counts"])
+        return GetUserResponse(**user)
 
     def update_user(self, name: str = None, password: str = None) -> UpdateUserResponse:
         payload = {}
@@ -137,8 +198,52 @@ class TodoApiClient:
     def delete_user(self) -> DeleteUserResponse:
         return DeleteUserResponse(**self._call("DELETE", "/user"))
 
-    def get_todos(self) -> GetTodoListResponse:
-        return tuple(TodoItem(**todo_item) for todo_item in self._call("GET", "/todo"))
+    def get_todos(
+        self,
+        limit: int = None,
+        after: int = None,
+        offset: int = None,
+        q: str = None,
+        done: bool = None,
+        important: bool = None,
+    ) -> GetTodoListResponse:
+        query = {}
+        if limit is not None:
+            query["limit"] = limit
+        if after is not None:
+            query["after"] = after
+        if offset is not None:
+            query["offset"] = offset
+        if q is not None:
+            query["q"] = q
+        if done is not None:
+            query["done"] = done
+        if important is not None:
+            query["important"] = important
+        return tuple(
+            TodoItem(**todo_item)
+            for todo_item in self._call("GET", "/todo", query_string=query)
+        )
+
+    def sync_todos(self, since: int = 0) -> TodoChangesResponse:
+        changes = self._call("GET", "/todo", query_string={"since": since})
+        changes["todos"] = tuple(TodoItem(**todo) for todo in changes["todos"])
+        return TodoChangesResponse(**changes)
+
+    def get_todo_stats(self, since: str = None, until: str = None) -> TodoStatsResponse:
+        query = {}
+        if since is not None:
+            query["since"] = since
+        if until is not None:
+            query["until"] = until
+        stats = self._call("GET", "/todo/stats", query_string=query)
+        stats["todo_counts"] = TodoStatsCounts(**stats["todo_counts"])
+        stats["completion_seconds"] = CompletionSeconds(**stats["completion_seconds"])
+        return TodoStatsResponse(**stats)
+
+    def export_todos(self) -> GetTodoListResponse:
+        lines = self._call("GET", "/todo/export", response_type="text").splitlines()
+        return tuple(TodoItem(**json.loads(line)) for line in lines)
 
     def get_todo(self, todo_id: int) -> GetTodoResponse:
         return GetTodoResponse(**self._call("GET", f"/todo/{todo_id}"))
@@ -157,7 +262,28 @@ class TodoApiClient:
             **self._call("PATCH", f"/todo/{todo_id}", json=payload)
         )
 
+    def delete_todo(self, todo_id: int) -> DeleteTodoResponse:
+        return DeleteTodoResponse(**self._call("DELETE", f"/todo/{todo_id}"))
+
     def create_todo(self, name: str, important: bool = False) -> CreateTodoResponse:
         return CreateTodoResponse(
             **self._call("POST", "/todo", json={"name": name, "important": important})
         )
+
+    def bulk_todos(
+        self, create: list = None, update: list = None, delete: list = None
+    ) -> BulkTodoResponse:
+        payload = {}
+        if create is not None:
+            payload["create"] = create
+        if update is not None:
+            payload["update"] = update
+        if delete is not None:
+            payload["delete"] = delete
+        response = self._call("POST", "/todo/bulk", json=payload)
+        return BulkTodoResponse(
+            **{
+                action: [BulkItemResult(**item) for item in items]
+                for action, items in response.items()
+            }
+        )
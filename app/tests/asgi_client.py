@@ -0,0 +1,62 @@
+import httpx
+from starlette.testclient import TestClient
+from starlette.types import ASGIApp
+
+
+class AsgiResponse:
+    def __init__(self, response: httpx.Response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.text = response.text
+
+    @property
+    def mimetype(self) -> str:
+        return self.headers.get("content-type", "").split(";")[0]
+
+    def json(self):
+        return self.response.json()
+
+
+class AsgiTestClient:
+    def __init__(self, app: ASGIApp):
+        self.client = TestClient(app)
+
+    def __enter__(self):
+        self.client.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.client.__exit__(*args)
+
+    def open(
+        self,
+        method: str,
+        url: str,
+        json: dict = None,
+        data: bytes = None,
+        headers: dict = None,
+        query_string: dict = None,
+    ) -> AsgiResponse:
+        return AsgiResponse(
+            self.client.request(
+                method,
+                url,
+                json=json,
+                content=data,
+                headers=headers,
+                params=query_string,
+            )
+        )
+
+    def get(self, url: str, **kwargs) -> AsgiResponse:
+        return self.open("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> AsgiResponse:
+        return self.open("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> AsgiResponse:
+        return self.open("PATCH", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> AsgiResponse:
+        return self.open("DELETE", url, **kwargs)
@@ -1,6 +1,9 @@
+import os
+
+import migrations
 import pytest
-from main import app
-from models import Base, engine
+from main import create_app
+from models import Base, get_engine
 
 from .api_client import TodoApiClient
 from .constants import (
@@ -12,15 +15,18 @@ from .constants import (
     NEW_USER_NAME_WITH_TODOS,
 )
 
+APP_MODE = os.getenv("APP_MODE", "wsgi")
+
 
 @pytest.fixture(scope="session", autouse=True)
 def init_db():
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.drop_all(bind=get_engine())
+    migrations.init_db()
 
 
 @pytest.fixture(scope="session")
 def flask_app():
+    app = create_app()
     app.config.update(
         {
             "TESTING": True,
@@ -30,14 +36,27 @@ def flask_app():
     yield app
 
 
+@pytest.fixture(scope="session")
+def test_client_factory(flask_app):
+    if APP_MODE == "asgi":
+        from asgi import app as asgi_app
+
+        from .asgi_client import AsgiTestClient
+
+        with AsgiTestClient(asgi_app) as test_client:
+            yield lambda: test_client
+    else:
+        yield flask_app.test_client
+
+
 @pytest.fixture()
-def client(flask_app):
-    return TodoApiClient(app.test_client())
+def client(test_client_factory):
+    return TodoApiClient(test_client_factory())
 
 
 @pytest.fixture(scope="session")
-def default_user_client(flask_app) -> TodoApiClient:
-    client = TodoApiClient(app.test_client())
+def default_user_client(test_client_factory) -> TodoApiClient:
+    client = TodoApiClient(test_client_factory())
     client.create_user(DEFAULT_USER_NAME, DEFAULT_USER_PASSWORD)
     client.auth(DEFAULT_USER_NAME, DEFAULT_USER_PASSWORD)
     return client
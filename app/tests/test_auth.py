@@ -0,0 +1,273 @@
+import datetime
+import os
+import signal
+import threading
+import time
+
+import auth
+import crud
+import pytest
+from auth import CachedToken, TokenCache, token_cache
+from cache import TTLCache
+from config import DB_URL, TOKEN_CACHE_CHANNEL
+from crud import prune_expired_tokens
+from models import Session, Token, User
+from sqlalchemy import delete, func, select, update
+
+from .api_client import HttpError
+from .constants import DEFAULT_USER_PASSWORD
+
+
+class TestTTLCache:
+    def test_lru_eviction(self):
+        cache = TTLCache(2, 60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_expiration(self):
+        cache = TTLCache(2, 0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_stats(self):
+        cache = TTLCache(2, 60)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        assert cache.stats == {"hits": 1, "misses": 1, "size": 1}
+
+
+def wait_for(predicate, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture()
+def token_caches():
+    caches = [TokenCache(10, 60, DB_URL, TOKEN_CACHE_CHANNEL) for _ in range(2)]
+    assert all(cache.wait(5) for cache in caches)
+    yield caches
+    for cache in caches:
+        cache.stop()
+
+
+class TestTokenCache:
+    @pytest.fixture(autouse=True)
+    def listening(self):
+        assert token_cache.wait(5)
+
+    def test_cache_hit(self, new_user_client):
+        new_user_client.get_user()
+        hits = token_cache.hits
+        new_user_client.get_user()
+        assert token_cache.hits == hits + 1
+
+    def test_delete_user_evicts_tokens(self, client):
+        client.create_user("test_delete_user_evicts_tokens", DEFAULT_USER_PASSWORD)
+        client.auth("test_delete_user_evicts_tokens", DEFAULT_USER_PASSWORD)
+        client.get_user()
+        assert token_cache.get(client.headers["Authorization"]) is not None
+        client.delete_user()
+        assert token_cache.get(client.headers["Authorization"]) is None
+        with pytest.raises(HttpError) as excinfo:
+            client.create_todo("test_delete_user_evicts_tokens")
+        assert excinfo.value.status_code == 401
+
+    @pytest.mark.parametrize(
+        "call",
+        [
+            lambda client: client.create_todo("test_stale_token"),
+            lambda client: client.bulk_todos(
+                create=[{"name": "test_stale_token", "important": False}]
+            ),
+            lambda client: client.export_todos(),
+        ],
+    )
+    def test_stale_token_of_deleted_user(self, client, call):
+        user = client.create_user("test_stale_token", DEFAULT_USER_PASSWORD)
+        client.auth("test_stale_token", DEFAULT_USER_PASSWORD)
+        client.get_user()
+        token = client.headers["Authorization"]
+        with Session() as session:
+            session.execute(delete(Token).where(Token.user_id == user.id))
+            session.execute(delete(User).where(User.id == user.id))
+            session.commit()
+        assert token_cache.get(token) is not None
+        with pytest.raises(HttpError) as excinfo:
+            call(client)
+        assert excinfo.value.status_code == 401
+        assert token_cache.get(token) is None
+
+    def test_revocation_broadcast(self, new_user_client, token_caches):
+        user = new_user_client.get_user()
+        token = new_user_client.login(user.name, DEFAULT_USER_PASSWORD).token
+        other_token = new_user_client.login(user.name, DEFAULT_USER_PASSWORD).token
+        expires_at = datetime.datetime.now(datetime.timezone.utc)
+        for cache in token_caches:
+            cache.set(token, CachedToken(0, user.id, expires_at))
+            cache.set(other_token, CachedToken(0, user.id, expires_at))
+        with Session() as session:
+            crud.revoke_tokens(user.id, session, get_token_id(token))
+        assert wait_for(lambda: all(cache.get(token) is None for cache in token_caches))
+        assert all(cache.get(other_token) for cache in token_caches)
+
+    def test_delete_user_broadcast(self, client, token_caches):
+        user = client.create_user("test_delete_user_broadcast", DEFAULT_USER_PASSWORD)
+        client.auth("test_delete_user_broadcast", DEFAULT_USER_PASSWORD)
+        token = client.headers["Authorization"]
+        expires_at = datetime.datetime.now(datetime.timezone.utc)
+        for cache in token_caches:
+            cache.set(token, CachedToken(0, user.id, expires_at))
+        client.delete_user()
+        assert wait_for(lambda: all(cache.get(token) is None for cache in token_caches))
+
+    def test_stale_set_after_revocation(self, token_caches):
+        cache = token_caches[0]
+        generation = cache.generation
+        cache.evict(tokens=["stale"])
+        cache.set("stale", CachedToken(0, 0, None), generation)
+        assert cache.get("stale") is None
+
+
+def get_token_id(token: str) -> int:
+    with Session() as session:
+        return session.scalar(select(Token.id).where(Token.token == token))
+
+
+def set_token_expiry(token: str, expires_at):
+    with Session() as session:
+        session.execute(
+            update(Token).where(Token.token == token).values(expires_at=expires_at)
+        )
+        session.commit()
+    token_cache.pop(token)
+
+
+def get_token_expiry(token: str) -> datetime.datetime | None:
+    with Session() as session:
+        return session.scalar(select(Token.expires_at).where(Token.token == token))
+
+
+class TestTokens:
+    def test_login_returns_expiry(self, new_user_client):
+        user = new_user_client.get_user()
+        token = new_user_client.login(user.name, DEFAULT_USER_PASSWORD)
+        assert get_token_expiry(token.token) > datetime.datetime.now(
+            datetime.timezone.utc
+        ) + datetime.timedelta(seconds=auth.TOKEN_TTL - 60)
+
+    def test_expired_token(self, new_user_client):
+        token = new_user_client.headers["Authorization"]
+        user = new_user_client.get_user()
+        set_token_expiry(token, func.now() - datetime.timedelta(seconds=1))
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client.get_user()
+        assert excinfo.value.status_code == 401
+        new_user_client.auth(user.name, DEFAULT_USER_PASSWORD)
+
+    def test_sliding_refresh(self, new_user_client):
+        token = new_user_client.headers["Authorization"]
+        set_token_expiry(token, func.now() + datetime.timedelta(seconds=60))
+        new_user_client.get_user()
+        assert get_token_expiry(token) > datetime.datetime.now(
+            datetime.timezone.utc
+        ) + datetime.timedelta(seconds=auth.TOKEN_TTL - 60)
+
+    def test_logout(self, new_user_client):
+        user = new_user_client.get_user()
+        other_token = new_user_client.login(user.name, DEFAULT_USER_PASSWORD).token
+        assert new_user_client.logout().status == "ok"
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client.get_user()
+        assert excinfo.value.status_code == 401
+        new_user_client.headers["Authorization"] = other_token
+        assert new_user_client.get_user().name == user.name
+
+    def test_logout_all(self, new_user_client):
+        user = new_user_client.get_user()
+        other_token = new_user_client.login(user.name, DEFAULT_USER_PASSWORD).token
+        new_user_client.logout(all=True)
+        new_user_client.headers["Authorization"] = other_token
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client.get_user()
+        assert excinfo.value.status_code == 401
+        new_user_client.auth(user.name, DEFAULT_USER_PASSWORD)
+
+    def test_tokens_per_user_cap(self, new_user_client, monkeypatch):
+        monkeypatch.setattr(crud, "TOKEN_MAX_PER_USER", 2)
+        user = new_user_client.get_user()
+        new_user_client.login(user.name, DEFAULT_USER_PASSWORD)
+        last_token = new_user_client.login(user.name, DEFAULT_USER_PASSWORD).token
+        with Session() as session:
+            count = session.scalar(
+                select(func.count(Token.id)).where(Token.user_id == user.id)
+            )
+        assert count == 2
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client.get_user()
+        assert excinfo.value.status_code == 401
+        new_user_client.headers["Authorization"] = last_token
+        assert new_user_client.get_user().name == user.name
+
+    def test_prune_expired_tokens(self, new_user_client):
+        user = new_user_client.get_user()
+        tokens = [
+            new_user_client.login(user.name, DEFAULT_USER_PASSWORD).token
+            for _ in range(3)
+        ]
+        for token in tokens:
+            set_token_expiry(token, func.now() - datetime.timedelta(seconds=1))
+        with Session() as session:
+            assert prune_expired_tokens(session, batch_size=2) >= 3
+        assert all(get_token_expiry(token) is None for token in tokens)
+        assert new_user_client.get_user().name == user.name
+
+    def test_prune_tokens_command(self, flask_app):
+        result = flask_app.test_cli_runner().invoke(args=["prune-tokens"])
+        assert result.exit_code == 0
+        assert "expired tokens" in result.output
+
+
+class TestPasswordHashing:
+    def test_rehash_on_login(self, client, monkeypatch):
+        client.create_user("test_rehash_on_login", DEFAULT_USER_PASSWORD)
+        monkeypatch.setattr(auth, "BCRYPT_LOG_ROUNDS", 4)
+        client.login("test_rehash_on_login", DEFAULT_USER_PASSWORD)
+        with Session() as session:
+            user = session.query(User).filter_by(name="test_rehash_on_login").one()
+            assert user.password.startswith("$2b$04$")
+        assert client.login("test_rehash_on_login", DEFAULT_USER_PASSWORD).token
+
+    def test_update_password(self, new_user_client):
+        new_user_client.update_user(password="New_Password_1")
+        user = new_user_client.get_user()
+        assert new_user_client.login(user.name, "New_Password_1").token
+
+    def test_hash_queue_full(self, client, monkeypatch):
+        monkeypatch.setattr(auth, "hash_queue", threading.BoundedSemaphore(1))
+        monkeypatch.setattr(auth, "HASH_QUEUE_TIMEOUT", 0)
+        auth.hash_queue.acquire()
+        with pytest.raises(HttpError) as excinfo:
+            client.create_user("test_hash_queue_full", DEFAULT_USER_PASSWORD)
+        assert excinfo.value.status_code == 503
+
+    def test_broken_hash_pool(self, client):
+        client.create_user("test_broken_hash_pool", DEFAULT_USER_PASSWORD)
+        pool = auth.get_hash_pool()
+        for pid in list(pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        assert client.login("test_broken_hash_pool", DEFAULT_USER_PASSWORD).token
+        assert auth.get_hash_pool() is not pool
+        client.auth("test_broken_hash_pool", DEFAULT_USER_PASSWORD)
+        client.delete_user()
@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+from change_feed import ChangeFeed, PostgresChangeFeed, change_feed
+from config import DB_URL
+from models import Session
+from sqlalchemy import text
+
+from .api_client import HttpError
+from .conftest import APP_MODE
+
+
+async def next_message(queue: asyncio.Queue, timeout: float = 5) -> dict:
+    return await asyncio.wait_for(queue.get(), timeout)
+
+
+class TestChangeFeed:
+    def test_local_dispatch(self):
+        feed = ChangeFeed()
+
+        async def run():
+            async with feed.subscribe(1) as queue:
+                feed.after_commit({1, 2})
+                assert await next_message(queue) == {"user_id": 1}
+                assert queue.empty()
+            assert feed._subscribers == {}
+
+        asyncio.run(run())
+
+    def test_full_queue_drops_messages(self):
+        feed = ChangeFeed()
+
+        async def run():
+            async with feed.subscribe(1) as queue:
+                for _ in range(queue.maxsize + 1):
+                    feed.dispatch({"user_id": 1})
+                await asyncio.sleep(0)
+                assert queue.full()
+
+        asyncio.run(run())
+
+    def test_postgres_notify_on_commit(self):
+        feed = PostgresChangeFeed(DB_URL, "test_postgres_notify_on_commit")
+
+        async def run():
+            async with feed.subscribe(1) as queue:
+                with Session() as session:
+                    feed.before_commit(session, {1})
+                    session.rollback()
+                    feed.before_commit(session, {1})
+                    session.commit()
+                assert await next_message(queue) == {"user_id": 1}
+                assert queue.empty()
+            await feed.stop()
+
+        asyncio.run(run())
+
+    def test_postgres_notify_batched(self):
+        feed = PostgresChangeFeed(DB_URL, "test_postgres_notify_batched")
+
+        async def run():
+            async with feed.subscribe(1) as first, feed.subscribe(2) as second:
+                with Session() as session:
+                    feed.before_commit(session, {1, 2})
+                    session.commit()
+                assert await next_message(first) == {"user_id": 1}
+                assert await next_message(second) == {"user_id": 2}
+            await feed.stop()
+
+        asyncio.run(run())
+
+    def test_postgres_disconnect_closes_streams(self):
+        feed = PostgresChangeFeed(DB_URL, "test_postgres_disconnect")
+
+        async def run():
+            async with feed.subscribe(1) as queue:
+                pid = feed._connection.get_server_pid()
+                with Session() as session:
+                    session.execute(
+                        text("SELECT pg_terminate_backend(:pid)"), {"pid": pid}
+                    )
+                assert await next_message(queue) is None
+            async with feed.subscribe(1) as queue:
+                with Session() as session:
+                    feed.before_commit(session, {1})
+                    session.commit()
+                assert await next_message(queue) == {"user_id": 1}
+            await feed.stop()
+
+        asyncio.run(run())
+
+    def test_todo_changes_published(self, new_user_client):
+        user_id = new_user_client.get_user().id
+
+        async def run():
+            async with change_feed.subscribe(user_id) as queue:
+                await asyncio.to_thread(new_user_client.create_todo, "test_changes")
+                assert await next_message(queue) == {"user_id": user_id}
+            await change_feed.stop()
+
+        asyncio.run(run())
+
+    def test_failed_write_not_published(self, new_user_client):
+        user_id = new_user_client.get_user().id
+
+        async def run():
+            async with change_feed.subscribe(user_id) as queue:
+                with pytest.raises(HttpError):
+                    await asyncio.to_thread(new_user_client.update_todo, 0, name="x")
+                await asyncio.to_thread(new_user_client.create_todo, "test_changes")
+                assert await next_message(queue) == {"user_id": user_id}
+                assert queue.empty()
+            await change_feed.stop()
+
+        asyncio.run(run())
+
+    @pytest.mark.skipif(APP_MODE != "asgi", reason="events are served by the ASGI app")
+    def test_events_without_auth(self, client_non_authorized):
+        with pytest.raises(HttpError) as excinfo:
+            client_non_authorized._call("GET", "/todo/events", response_type=None)
+        assert excinfo.value.status_code == 401
+
+    @pytest.mark.skipif(APP_MODE != "asgi", reason="events are served by the ASGI app")
+    def test_events_stream(self, new_user_client):
+        from asgi import app as asgi_app
+
+        token = new_user_client.headers["Authorization"]
+        messages = asyncio.Queue()
+        disconnected = asyncio.Event()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/todo/events",
+            "raw_path": b"/todo/events",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"authorization", token.encode())],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            await messages.put(message)
+
+        async def run():
+            stream = asyncio.create_task(asgi_app(scope, receive, send))
+            start = await next_message(messages)
+            assert start["status"] == 200
+            assert (await next_message(messages))["body"] == b": connected\n\n"
+            await asyncio.to_thread(new_user_client.create_todo, "test_events")
+            body = (await next_message(messages))["body"]
+            assert body.startswith(b"event: change\ndata: ")
+            assert b'"user_id"' in body
+            disconnected.set()
+            await asyncio.wait_for(stream, 5)
+
+        new_user_client.client.client.portal.call(run)
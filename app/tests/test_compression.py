@@ -0,0 +1,87 @@
+import gzip
+import json
+import zlib
+
+import pytest
+from response_compression import compress, compress_stream
+
+from .conftest import APP_MODE
+
+brotli = pytest.importorskip("brotli")
+
+DECOMPRESS = {"gzip": gzip.decompress, "br": brotli.decompress}
+
+
+@pytest.fixture()
+def client_with_many_todos(new_user_client):
+    new_user_client.bulk_todos(
+        create=[{"name": f"todo_{number}", "important": False} for number in range(50)]
+    )
+    return new_user_client
+
+
+class TestCompress:
+    @pytest.mark.parametrize("encoding", DECOMPRESS)
+    def test_compress(self, encoding):
+        data = b'{"name": "todo"}\n' * 100
+        assert DECOMPRESS[encoding](compress(data, encoding)) == data
+
+    @pytest.mark.parametrize("encoding", DECOMPRESS)
+    def test_compress_stream(self, encoding):
+        chunks = [b'{"name": "todo"}\n'] * 100
+        compressed = b"".join(compress_stream(iter(chunks), encoding))
+        assert DECOMPRESS[encoding](compressed) == b"".join(chunks)
+
+    @pytest.mark.parametrize("encoding", DECOMPRESS)
+    def test_compress_stream_flushes(self, encoding):
+        chunk = b'{"name": "todo"}\n' * 300
+        stream = compress_stream(iter([chunk, chunk]), encoding)
+        if encoding == "br":
+            decompressor = brotli.Decompressor()
+            assert decompressor.process(next(stream)) == chunk
+        else:
+            decompressor = zlib.decompressobj(31)
+            assert decompressor.decompress(next(stream)) == chunk
+
+
+@pytest.mark.skipif(APP_MODE == "asgi", reason="compression is WSGI only")
+class TestCompression:
+    def get(self, client, path: str, accept_encoding: str):
+        return client.client.get(
+            path, headers={**client.headers, "Accept-Encoding": accept_encoding}
+        )
+
+    @pytest.mark.parametrize(
+        "accept_encoding, encoding",
+        [
+            ("gzip", "gzip"),
+            ("gzip, deflate, br", "br"),
+            ("br;q=0.5, gzip", "gzip"),
+            ("*", "br"),
+        ],
+    )
+    def test_negotiation(self, client_with_many_todos, accept_encoding, encoding):
+        expected = client_with_many_todos.get_todos(limit=50)
+        response = self.get(client_with_many_todos, "/todo?limit=50", accept_encoding)
+        assert response.headers["Content-Encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert int(response.headers["Content-Length"]) == len(response.data)
+        todos = json.loads(DECOMPRESS[encoding](response.data))
+        assert [todo["id"] for todo in todos] == [todo.id for todo in expected]
+
+    @pytest.mark.parametrize("accept_encoding", ["", "identity", "gzip;q=0, br;q=0"])
+    def test_identity(self, client_with_many_todos, accept_encoding):
+        response = self.get(client_with_many_todos, "/todo?limit=50", accept_encoding)
+        assert "Content-Encoding" not in response.headers
+        assert len(json.loads(response.data)) == 50
+
+    def test_small_response(self, new_user_client):
+        response = self.get(new_user_client, "/user", "gzip")
+        assert "Content-Encoding" not in response.headers
+        assert json.loads(response.data)["id"]
+
+    def test_stream(self, client_with_many_todos):
+        response = self.get(client_with_many_todos, "/todo/export", "gzip")
+        assert response.headers["Content-Encoding"] == "gzip"
+        lines = gzip.decompress(response.data).splitlines()
+        assert len(lines) == 50
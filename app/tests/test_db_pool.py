@@ -0,0 +1,35 @@
+import pytest
+from config import DB_URL
+from db_pool import TimedQueuePool, get_pool_stats, pool_metrics, track_pool
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError
+
+
+class TestPoolMetrics:
+    def test_pool_stats(self, new_user_client):
+        new_user_client.get_user()
+        stats = get_pool_stats()["primary"]
+        assert stats["checkouts"] > 0
+        assert stats["in_use"] == 0
+        assert stats["wait_seconds_total"] > 0
+
+    def test_pool_timeout(self):
+        engine = create_engine(
+            DB_URL,
+            poolclass=TimedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.01,
+        )
+        metrics = track_pool(engine, "test_pool_timeout")
+        with engine.connect():
+            assert metrics.stats(engine.pool)["in_use"] == 1
+            with pytest.raises(TimeoutError):
+                engine.connect()
+        stats = metrics.stats(engine.pool)
+        assert stats["checkouts"] == 1
+        assert stats["timeouts"] == 1
+        assert stats["in_use"] == 0
+        assert stats["wait_seconds_max"] >= 0.01
+        engine.dispose()
+        pool_metrics.pop("test_pool_timeout")
@@ -0,0 +1,31 @@
+import pytest
+
+from .api_client import HttpError
+from .conftest import APP_MODE
+
+
+def get_sample(text: str, prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+@pytest.mark.skipif(APP_MODE == "asgi", reason="/metrics is WSGI only")
+class TestMetrics:
+    def test_request_metrics(self, new_user_client):
+        new_user_client.get_user()
+        text = new_user_client._call("GET", "/metrics", response_type="text")
+        labels = 'method="GET",status="200",view="user"'
+        assert get_sample(text, f"todo_requests_total{{{labels}}}") >= 1
+        assert get_sample(text, f"todo_request_duration_seconds_count{{{labels}}}")
+        assert 'todo_db_pool_connections{pool="primary",state="in_use"}' in text
+
+    def test_http_error_metrics(self, client_non_authorized):
+        prefix = 'todo_http_errors_total{status="401"}'
+        text = client_non_authorized._call("GET", "/metrics", response_type="text")
+        before = get_sample(text, prefix)
+        with pytest.raises(HttpError):
+            client_non_authorized.get_user()
+        text = client_non_authorized._call("GET", "/metrics", response_type="text")
+        assert get_sample(text, prefix) == before + 1
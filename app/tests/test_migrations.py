@@ -0,0 +1,93 @@
+import pytest
+from config import DB_URL
+from migrations import migrate
+from models import Base, Session, Todo, Token, User
+from sqlalchemy import create_engine, inspect, select, text
+
+SCHEMA = "migration_test"
+
+BASELINE_SCHEMA = """
+CREATE TABLE todo_user (
+    id SERIAL NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    password VARCHAR(70) NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_todo_user_name ON todo_user (name);
+CREATE TABLE todo (
+    id SERIAL NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    important BOOLEAN NOT NULL,
+    done BOOLEAN NOT NULL,
+    start_time TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+    finish_time TIMESTAMP WITHOUT TIME ZONE,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES todo_user (id)
+);
+CREATE TABLE token (
+    id SERIAL NOT NULL,
+    token UUID DEFAULT gen_random_uuid() NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (token),
+    FOREIGN KEY(user_id) REFERENCES todo_user (id)
+);
+INSERT INTO todo_user (name, password) VALUES ('baseline', 'hash');
+INSERT INTO token (user_id) VALUES (1);
+INSERT INTO todo (name, important, done, user_id) VALUES
+    ('first', true, false, 1),
+    ('second', false, true, 1);
+"""
+
+
+@pytest.fixture()
+def baseline_engine():
+    engine = create_engine(DB_URL, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        connection.execute(text(BASELINE_SCHEMA))
+    yield engine
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    engine.dispose()
+
+
+class TestMigrations:
+    def test_migrate_baseline(self, baseline_engine):
+        migrate(baseline_engine)
+        migrate(baseline_engine)
+        inspector = inspect(baseline_engine)
+        for table in Base.metadata.sorted_tables:
+            columns = {
+                column["name"]: column for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                assert column.name in columns, f"{table.name}.{column.name}"
+                assert columns[column.name]["nullable"] == column.nullable
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            expected = {index.name for index in table.indexes}
+            if "ix_todo_name_trgm" in expected - indexes:
+                expected.remove("ix_todo_name_trgm")
+            assert expected <= indexes, table.name
+        with Session(bind=baseline_engine) as session:
+            token = session.scalars(select(Token)).one()
+            assert token.expires_at > session.scalar(select(text("now()")))
+            todos = session.scalars(select(Todo).order_by(Todo.id)).all()
+            assert [todo.change_seq for todo in todos] == [0, 0]
+            assert all(todo.updated_at for todo in todos)
+            user = session.get(User, 1)
+            assert user.version == 0
+            assert (user.todo_count, user.done_count, user.important_count) == (2, 1, 1)
+            session.add(Todo(name="third", user_id=1))
+            session.commit()
+            third = select(Todo.change_seq).where(Todo.name == "third")
+            assert session.scalar(third) > 0
+
+    def test_migrate_current_schema(self, baseline_engine):
+        with baseline_engine.begin() as connection:
+            connection.execute(text("DROP TABLE todo, token, todo_user"))
+        migrate(baseline_engine)
+        inspector = inspect(baseline_engine)
+        assert set(inspector.get_table_names()) == set(Base.metadata.tables)
@@ -0,0 +1,94 @@
+import time
+
+import async_views
+import fakeredis
+import main
+import pytest
+import rate_limit
+from rate_limit import (
+    LocalRateLimiter,
+    RateLimit,
+    RateLimiter,
+    RedisRateLimiter,
+    parse_rate_limits,
+)
+
+from .api_client import HttpError
+from .constants import DEFAULT_USER_PASSWORD
+
+
+@pytest.fixture(params=["local", "redis"])
+def limiter(request):
+    if request.param == "redis":
+        return RedisRateLimiter(fakeredis.FakeRedis())
+    return LocalRateLimiter(10)
+
+
+class TestRateLimiterBackends:
+    def test_burst(self, limiter):
+        limit = RateLimit(3, 60)
+        assert [limiter.acquire("a", limit) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert limiter.acquire("a", limit) == pytest.approx(20, abs=0.1)
+        assert limiter.acquire("b", limit) == 0.0
+
+    def test_refill(self, limiter):
+        limit = RateLimit(1, 0.05)
+        assert limiter.acquire("a", limit) == 0.0
+        assert limiter.acquire("a", limit) > 0
+        time.sleep(0.06)
+        assert limiter.acquire("a", limit) == 0.0
+
+    def test_incomplete_backend(self):
+        class IncompleteRateLimiter(RateLimiter):
+            pass
+
+        with pytest.raises(TypeError):
+            IncompleteRateLimiter()
+
+
+class TestParseRateLimits:
+    def test_parse(self):
+        assert parse_rate_limits("login:ip=10/60, todo:token=50/1,todo:ip=200/1") == {
+            "login": [("ip", RateLimit(10, 60))],
+            "todo": [("token", RateLimit(50, 1)), ("ip", RateLimit(200, 1))],
+        }
+        assert parse_rate_limits("") == {}
+
+    def test_unknown_key(self):
+        with pytest.raises(ValueError):
+            parse_rate_limits("login:user=10/60")
+
+
+@pytest.fixture()
+def rate_limits(monkeypatch):
+    limits = {}
+    monkeypatch.setattr(rate_limit, "rate_limits", limits)
+    monkeypatch.setattr(rate_limit, "rate_limiter", LocalRateLimiter(10))
+    return limits
+
+
+class TestRateLimit:
+    def test_login_by_ip(self, client, rate_limits, monkeypatch):
+        rate_limits["login"] = [("ip", RateLimit(2, 60))]
+        for _ in range(2):
+            with pytest.raises(HttpError) as excinfo:
+                client.login("test_login_by_ip", "wrong_password")
+            assert excinfo.value.status_code == 404
+        monkeypatch.setattr(main, "Session", None)
+        monkeypatch.setattr(async_views, "AsyncSession", None)
+        with pytest.raises(HttpError) as excinfo:
+            client.login("test_login_by_ip", "wrong_password")
+        assert excinfo.value.status_code == 429
+        assert excinfo.value.headers["Retry-After"] == "30"
+
+    def test_todo_by_token(self, new_user_client, rate_limits):
+        rate_limits["todo"] = [("token", RateLimit(1, 60))]
+        new_user_client.get_todos()
+        new_user_client.get_user()
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client.get_todos()
+        assert excinfo.value.status_code == 429
+        assert int(excinfo.value.headers["Retry-After"]) == 60
+        user = new_user_client.get_user()
+        new_user_client.auth(user.name, DEFAULT_USER_PASSWORD)
+        new_user_client.get_todos()
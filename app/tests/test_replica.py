@@ -0,0 +1,156 @@
+import os
+import time
+
+import fakeredis
+import models
+import pytest
+from auth import token_cache
+from config import DB_URL
+from db_pool import get_pool_options, pool_metrics, track_pool
+from models import READ_LSN_COOKIE, Base, replica_caught_up
+from read_lsn import LocalReadLsnStore, RedisReadLsnStore, read_lsn_store
+from sqlalchemy import create_engine, text
+
+from .conftest import APP_MODE
+
+TEST_REPLICA_URL = os.getenv("TEST_REPLICA_URL", DB_URL)
+
+
+def wait_for_replica(engine):
+    with models.get_engine().connect() as primary:
+        lsn = primary.scalar(text("SELECT pg_current_wal_lsn()"))
+    with engine.connect() as replica:
+        if not replica.scalar(text("SELECT pg_is_in_recovery()")):
+            return
+        while replica.scalar(
+            text("SELECT pg_last_wal_replay_lsn() < :lsn"), {"lsn": lsn}
+        ):
+            time.sleep(0.01)
+
+
+@pytest.fixture()
+def replica(monkeypatch):
+    engine = create_engine(TEST_REPLICA_URL, **get_pool_options())
+    metrics = track_pool(engine, "test_replica")
+    monkeypatch.setattr(models, "get_replica_engines", lambda: [engine])
+    yield engine, metrics
+    engine.dispose()
+    pool_metrics.pop("test_replica")
+
+
+@pytest.fixture()
+def empty_replica(monkeypatch):
+    engine = create_engine(DB_URL, **get_pool_options())
+    with engine.begin() as connection:
+        connection.execute(text("CREATE SCHEMA IF NOT EXISTS empty_replica"))
+    replica = engine.execution_options(schema_translate_map={None: "empty_replica"})
+    with replica.begin() as connection:
+        Base.metadata.create_all(connection)
+    monkeypatch.setattr(models, "get_replica_engines", lambda: [replica])
+    yield replica
+    with engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA empty_replica CASCADE"))
+    engine.dispose()
+
+
+@pytest.fixture(params=["local", "redis"])
+def lsn_store(request):
+    if request.param == "redis":
+        return RedisReadLsnStore(fakeredis.FakeRedis(), 60)
+    return LocalReadLsnStore(10, 60)
+
+
+def get_read_lsn_cookie(client) -> str | None:
+    cookie = client.client.get_cookie(READ_LSN_COOKIE)
+    return None if cookie is None else cookie.value
+
+
+def test_replica_caught_up(replica):
+    engine, metrics = replica
+    wait_for_replica(engine)
+    with models.get_engine().connect() as primary:
+        lsn = primary.scalar(text("SELECT CAST(pg_current_wal_lsn() AS TEXT)"))
+    assert replica_caught_up(engine, lsn)
+    assert not replica_caught_up(engine, "FFFFFFFF/FFFFFFFF")
+
+
+def test_read_lsn_store(lsn_store):
+    assert lsn_store.get("token") is None
+    lsn_store.set("token", "0/16B3748")
+    assert lsn_store.get("token") == "0/16B3748"
+    assert lsn_store.get("other") is None
+
+
+@pytest.mark.skipif(APP_MODE == "asgi", reason="replica routing is WSGI only")
+class TestReplicaRouting:
+    @pytest.fixture(autouse=True)
+    def clear_read_lsn(self, client):
+        client.client.delete_cookie(READ_LSN_COOKIE)
+        read_lsn_store.clear()
+
+    def test_reads_use_replica(self, replica, new_user_client_with_todos):
+        engine, metrics = replica
+        wait_for_replica(engine)
+        checkouts = metrics.checkouts
+        assert len(new_user_client_with_todos.get_todos()) == 2
+        assert new_user_client_with_todos.get_user().todo_counts.total == 2
+        assert metrics.checkouts > checkouts
+
+    def test_writes_use_primary(self, replica, new_user_client_with_todos):
+        engine, metrics = replica
+        checkouts = metrics.checkouts
+        new_user_client_with_todos.create_todo("test_writes_use_primary")
+        assert metrics.checkouts == checkouts
+
+    def test_write_sets_read_lsn(self, replica, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        new_user_client_with_todos.client.delete_cookie(READ_LSN_COOKIE)
+        new_user_client_with_todos.update_todo(todo.id, name="test_write_sets_read_lsn")
+        assert models.LSN_PATTERN.fullmatch(
+            get_read_lsn_cookie(new_user_client_with_todos)
+        )
+        todo = new_user_client_with_todos.get_todo(todo.id)
+        assert todo.name == "test_write_sets_read_lsn"
+
+    def test_lagging_replica_uses_primary(
+        self, replica, new_user_client_with_todos, monkeypatch
+    ):
+        engine, metrics = replica
+        new_user_client_with_todos.create_todo("test_lagging_replica_uses_primary")
+        monkeypatch.setattr(models, "replica_caught_up", lambda engine, lsn: False)
+        checkouts = metrics.checkouts
+        assert len(new_user_client_with_todos.get_todos()) == 3
+        assert metrics.checkouts == checkouts
+
+    def test_read_lsn_without_cookie(
+        self, replica, new_user_client_with_todos, monkeypatch
+    ):
+        engine, metrics = replica
+        new_user_client_with_todos.create_todo("test_read_lsn_without_cookie")
+        new_user_client_with_todos.client.delete_cookie(READ_LSN_COOKIE)
+        monkeypatch.setattr(models, "replica_caught_up", lambda engine, lsn: False)
+        checkouts = metrics.checkouts
+        assert len(new_user_client_with_todos.get_todos()) == 3
+        assert metrics.checkouts == checkouts
+
+    def test_replica_missing_user(self, empty_replica, new_user_client_with_todos):
+        assert token_cache.wait(5)
+        token = new_user_client_with_todos.headers["Authorization"]
+        new_user_client_with_todos.client.delete_cookie(READ_LSN_COOKIE)
+        read_lsn_store.clear()
+        assert new_user_client_with_todos.get_user().todo_counts.total == 2
+        assert len(new_user_client_with_todos.get_todos()) == 2
+        assert token_cache.get(token) is not None
+
+    def test_caught_up_replica_serves_reads(self, replica, new_user_client):
+        engine, metrics = replica
+        new_user_client.create_todo("test_caught_up_replica_serves_reads")
+        assert get_read_lsn_cookie(new_user_client) is not None
+        wait_for_replica(engine)
+        checkouts = metrics.checkouts
+        assert len(new_user_client.get_todos()) == 1
+        assert metrics.checkouts > checkouts
+
+    def test_no_read_lsn_without_replicas(self, new_user_client):
+        new_user_client.create_todo("test_no_read_lsn_without_replicas")
+        assert get_read_lsn_cookie(new_user_client) is None
@@ -0,0 +1,103 @@
+import pytest
+from response_cache import (
+    CachedResponse,
+    LocalResponseCache,
+    RedisResponseCache,
+    ResponseCache,
+    response_cache,
+)
+
+from .api_client import HttpError
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    def hget(self, name: str, key: str) -> bytes | None:
+        return self.hashes.get(name, {}).get(key)
+
+    def hset(self, name: str, key: str, value: bytes):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def expire(self, name: str, ttl: int):
+        pass
+
+    def delete(self, name: str):
+        self.hashes.pop(name, None)
+
+
+@pytest.fixture(params=["local", "redis"])
+def cache(request):
+    if request.param == "redis":
+        return RedisResponseCache(FakeRedis(), 60)
+    return LocalResponseCache(10, 60)
+
+
+class TestResponseCacheBackends:
+    response = CachedResponse(b'[{"id": 1}]\n', {"Link": '</todo?after=1>; rel="next"'})
+
+    def test_get_set(self, cache):
+        assert cache.get(1, 0, "/todo?") is None
+        cache.set(1, 0, "/todo?", self.response)
+        assert cache.get(1, 0, "/todo?") == self.response
+        assert cache.stats["hits"] == 1
+        assert cache.stats["misses"] == 1
+        assert cache.stats["hit_rate"] == 0.5
+
+    def test_keyed_by_user_and_version(self, cache):
+        cache.set(1, 0, "/todo?", self.response)
+        assert cache.get(2, 0, "/todo?") is None
+        assert cache.get(1, 1, "/todo?") is None
+
+    def test_invalidate(self, cache):
+        cache.set(1, 0, "/todo?", self.response)
+        cache.set(2, 0, "/todo?", self.response)
+        cache.invalidate(1)
+        assert cache.get(1, 0, "/todo?") is None
+        assert cache.get(2, 0, "/todo?") == self.response
+
+    def test_incomplete_backend(self):
+        class IncompleteResponseCache(ResponseCache):
+            def load(self, user_id: int, version: int, key: str):
+                return None
+
+        with pytest.raises(TypeError):
+            IncompleteResponseCache()
+
+
+class TestResponseCache:
+    def test_cache_hit(self, new_user_client_with_todos):
+        todos = new_user_client_with_todos.get_todos()
+        hits = response_cache.hits
+        assert new_user_client_with_todos.get_todos() == todos
+        assert response_cache.hits == hits + 1
+
+    def test_write_invalidates(self, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        new_user_client_with_todos.get_todo(todo.id)
+        new_user_client_with_todos.update_todo(todo.id, name="test_write_invalidates")
+        assert new_user_client_with_todos.get_todo(todo.id).name == (
+            "test_write_invalidates"
+        )
+        new_user_client_with_todos.delete_todo(todo.id)
+        assert todo.id not in [
+            item.id for item in new_user_client_with_todos.get_todos()
+        ]
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client_with_todos.get_todo(todo.id)
+        assert excinfo.value.status_code == 404
+
+    def test_bulk_invalidates(self, new_user_client):
+        assert new_user_client.get_todos() == ()
+        new_user_client.bulk_todos(create=[{"name": "bulk", "important": True}])
+        assert len(new_user_client.get_todos()) == 1
+
+    def test_not_shared_between_users(
+        self, default_user_client, new_user_client_with_todos
+    ):
+        todo = new_user_client_with_todos.get_todos()[0]
+        new_user_client_with_todos.get_todo(todo.id)
+        with pytest.raises(HttpError) as excinfo:
+            default_user_client.get_todo(todo.id)
+        assert excinfo.value.status_code == 403
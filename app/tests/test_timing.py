@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+import runpy
+
+import pytest
+import timing
+
+from .conftest import APP_MODE
+
+GUNICORN_CONF = os.path.join(os.path.dirname(__file__), "..", "gunicorn.conf.py")
+
+
+@pytest.mark.skipif(APP_MODE == "asgi", reason="Server-Timing is WSGI only")
+class TestServerTiming:
+    def test_server_timing_header(self, new_user_client):
+        response = new_user_client._call("GET", "/user", response_type=None)
+        phases = {
+            metric.split(";")[0]: metric
+            for metric in response.headers["Server-Timing"].split(", ")
+        }
+        assert phases.keys() >= {"db", "validate", "serialize", "total"}
+        assert "queries" in phases["db"]
+
+    def test_hash_timing(self, client):
+        response = client._call(
+            "POST",
+            "/user",
+            response_type=None,
+            json={"name": "test_hash_timing", "password": "Test_Password_1"},
+        )
+        assert "hash;dur=" in response.headers["Server-Timing"]
+
+    def test_timing_log(self, new_user_client, caplog):
+        with caplog.at_level(logging.INFO, logger="todo.timing"):
+            new_user_client.get_todos()
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record["path"] == "/todo"
+        assert record["status"] == 200
+        assert record["queries"] >= 2
+        assert record["total_ms"] >= record["db_ms"]
+
+    def test_timing_log_disabled(self, new_user_client, caplog, monkeypatch):
+        monkeypatch.setattr(timing, "json", None)
+        with caplog.at_level(logging.WARNING, logger="todo.timing"):
+            new_user_client.get_todos()
+        assert not [record for record in caplog.records if record.name == "todo.timing"]
+
+
+def test_gunicorn_logs_timings():
+    config = runpy.run_path(GUNICORN_CONF)
+    loggers = config["logconfig_dict"]["loggers"]
+    assert loggers["todo.timing"]["level"] == "INFO"
+    assert loggers["todo.timing"]["handlers"] == ["console"]
+    assert "gunicorn.error" in loggers
@@ -1,4 +1,6 @@
 import pytest
+from crud import compact_tombstones
+from models import Session
 
 from .api_client import HttpError
 from .constants import (
@@ -14,13 +16,24 @@ class TestTodo:
             name="test_create_todo", important=important
         )
         assert response.id is not None
-        assert new_user_client.get_user().todos == [response.id]
+        assert new_user_client.get_user(with_todos=True).todos == [response.id]
 
     def test_create_todo_with_empty_name(self, new_user_client):
         with pytest.raises(HttpError) as excinfo:
             new_user_client._call("POST", "/todo", json={"important": False})
         assert excinfo.value.status_code == 400
 
+    def test_create_todo_with_invalid_json(self, new_user_client):
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client._call(
+                "POST",
+                "/todo",
+                data=b'{"name": "test_create_todo_with_invalid_json",',
+                headers={"Content-Type": "application/json"},
+            )
+        assert excinfo.value.status_code == 400
+        assert "json_invalid" in excinfo.value.description
+
     def test_create_todo_without_auth(self, client_non_authorized):
         with pytest.raises(HttpError) as excinfo:
             client_non_authorized.create_todo("test_create_todo_without_auth")
@@ -87,3 +100,272 @@ class TestTodo:
         todo = new_user_client_with_todos.get_todo(todo.id)
         assert todo.done is True
         assert todo.finish_time is not None
+
+    def test_get_todos_paginated(self, new_user_client_with_todos):
+        first_page = new_user_client_with_todos.get_todos(limit=1)
+        assert len(first_page) == 1
+        assert first_page[0].name == NEW_TODO_ITEM_IMPORTANT
+        second_page = new_user_client_with_todos.get_todos(
+            limit=1, after=first_page[0].id
+        )
+        assert len(second_page) == 1
+        assert second_page[0].name == NEW_TODO_ITEM_NOT_IMPORTANT
+        assert new_user_client_with_todos.get_todos(after=second_page[0].id) == ()
+
+    def test_get_todos_next_link(self, new_user_client_with_todos):
+        response = new_user_client_with_todos._call(
+            "GET", "/todo", response_type=None, query_string={"limit": 1}
+        )
+        assert 'rel="next"' in response.headers["Link"]
+        response = new_user_client_with_todos._call(
+            "GET", "/todo", response_type=None, query_string={"limit": 3}
+        )
+        assert "Link" not in response.headers
+
+    def test_get_todos_filtered(self, new_user_client_with_todos):
+        todos = new_user_client_with_todos.get_todos(important=True)
+        assert [todo.name for todo in todos] == [NEW_TODO_ITEM_IMPORTANT]
+        todos = new_user_client_with_todos.get_todos(important=False, done=False)
+        assert [todo.name for todo in todos] == [NEW_TODO_ITEM_NOT_IMPORTANT]
+        assert new_user_client_with_todos.get_todos(done=True) == ()
+
+    def test_search_todos(self, new_user_client):
+        for name in ["buy groceries", "groceries", "call mom", "Groceries list"]:
+            new_user_client.create_todo(name, important=name != "call mom")
+        todos = new_user_client.get_todos(q="groceries")
+        assert [todo.name for todo in todos] == [
+            "groceries",
+            "Groceries list",
+            "buy groceries",
+        ]
+        todos = new_user_client.get_todos(q="GROCERIES", important=True, limit=1)
+        assert [todo.name for todo in todos] == ["groceries"]
+        todos = new_user_client.get_todos(q="groceries", limit=2, offset=2)
+        assert [todo.name for todo in todos] == ["buy groceries"]
+        assert new_user_client.get_todos(q="%") == ()
+
+    def test_search_todos_next_link(self, new_user_client_with_todos):
+        response = new_user_client_with_todos._call(
+            "GET", "/todo", response_type=None, query_string={"limit": 1, "q": "a"}
+        )
+        assert "offset=1" in response.headers["Link"]
+
+    def test_get_todos_wrong_limit(self, new_user_client_with_todos):
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client_with_todos.get_todos(limit=0)
+        assert excinfo.value.status_code == 400
+
+    def test_sync_todos(self, new_user_client_with_todos):
+        initial = new_user_client_with_todos.sync_todos()
+        assert initial.reset
+        assert len(initial.todos) == 2
+        first, second = initial.todos
+        assert new_user_client_with_todos.sync_todos(initial.cursor).todos == ()
+        created = new_user_client_with_todos.create_todo("test_sync_todos")
+        new_user_client_with_todos.update_todo(first.id, done=True)
+        new_user_client_with_todos.delete_todo(second.id)
+        changes = new_user_client_with_todos.sync_todos(initial.cursor)
+        assert not changes.reset
+        assert {todo.id for todo in changes.todos} == {first.id, created.id}
+        assert changes.deleted == [second.id]
+        assert changes.cursor >= initial.cursor
+
+    def test_sync_todos_bulk(self, new_user_client_with_todos):
+        cursor = new_user_client_with_todos.sync_todos().cursor
+        todo = new_user_client_with_todos.get_todos()[0]
+        new_user_client_with_todos.bulk_todos(
+            create=[{"name": "bulk_sync", "important": False}], delete=[todo.id]
+        )
+        changes = new_user_client_with_todos.sync_todos(cursor)
+        assert [todo.name for todo in changes.todos] == ["bulk_sync"]
+        assert changes.deleted == [todo.id]
+
+    def test_sync_todos_after_compaction(self, new_user_client_with_todos):
+        cursor = new_user_client_with_todos.sync_todos().cursor
+        todo = new_user_client_with_todos.get_todos()[0]
+        new_user_client_with_todos.delete_todo(todo.id)
+        with Session() as session:
+            assert compact_tombstones(session, older_than=0) >= 1
+        changes = new_user_client_with_todos.sync_todos(cursor)
+        assert changes.reset
+        assert changes.deleted == []
+        assert todo.id not in {todo.id for todo in changes.todos}
+        assert len(changes.todos) == 1
+        assert not new_user_client_with_todos.sync_todos(changes.cursor).reset
+
+    def test_compact_tombstones_command(self, flask_app):
+        result = flask_app.test_cli_runner().invoke(args=["compact-tombstones"])
+        assert result.exit_code == 0
+        assert "tombstones" in result.output
+
+    def test_todo_stats(self, new_user_client_with_todos):
+        todos = new_user_client_with_todos.get_todos()
+        new_user_client_with_todos.update_todo(todos[0].id, done=True)
+        stats = new_user_client_with_todos.get_todo_stats()
+        assert stats.todo_counts == (2, 1, 1, 1)
+        assert stats.completion_rate == 0.5
+        assert stats.completion_seconds.median >= 0
+        assert stats.completion_seconds.p90 >= stats.completion_seconds.median
+
+    def test_todo_stats_date_range(self, new_user_client_with_todos):
+        stats = new_user_client_with_todos.get_todo_stats(until="2000-01-01T00:00:00")
+        assert stats.todo_counts == (0, 0, 0, 0)
+        assert stats.completion_rate is None
+        assert stats.completion_seconds == (None, None)
+        stats = new_user_client_with_todos.get_todo_stats(since="2000-01-01T00:00:00")
+        assert stats.todo_counts.total == 2
+
+    def test_todo_stats_without_auth(self, client_non_authorized):
+        with pytest.raises(HttpError) as excinfo:
+            client_non_authorized.get_todo_stats()
+        assert excinfo.value.status_code == 401
+
+    def test_export_todos(self, new_user_client_with_todos):
+        response = new_user_client_with_todos._call(
+            "GET", "/todo/export", response_type=None
+        )
+        assert response.mimetype == "application/x-ndjson"
+        todos = new_user_client_with_todos.export_todos()
+        assert todos == new_user_client_with_todos.get_todos()
+
+    def test_export_todos_without_auth(self, client_non_authorized):
+        with pytest.raises(HttpError) as excinfo:
+            client_non_authorized.export_todos()
+        assert excinfo.value.status_code == 401
+
+    def test_bulk_create(self, new_user_client):
+        response = new_user_client.bulk_todos(
+            create=[
+                {"name": "bulk_1", "important": True},
+                {"name": "bulk_2", "important": False},
+            ]
+        )
+        todos = new_user_client.get_todos()
+        assert [item.id for item in response.create] == [todo.id for todo in todos]
+        assert [todo.name for todo in todos] == ["bulk_1", "bulk_2"]
+
+    def test_bulk_update_and_delete(self, new_user_client_with_todos):
+        first, second = new_user_client_with_todos.get_todos()
+        response = new_user_client_with_todos.bulk_todos(
+            update=[
+                {"id": first.id, "done": True},
+                {"id": second.id, "name": "bulk_name", "important": True},
+            ],
+            delete=[first.id],
+        )
+        assert [item.status for item in response.update] == ["ok", "ok"]
+        assert [item.status for item in response.delete] == ["ok"]
+        todos = new_user_client_with_todos.get_todos()
+        assert len(todos) == 1
+        assert todos[0].name == "bulk_name"
+        assert todos[0].important is True
+
+    def test_bulk_not_owner(self, default_user_client, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        response = default_user_client.bulk_todos(
+            update=[{"id": todo.id, "name": "stolen"}], delete=[todo.id, 9999999]
+        )
+        assert response.update[0].description == "access denied"
+        assert response.delete[0].description == "access denied"
+        assert response.delete[1].description == "Todo not found"
+        assert new_user_client_with_todos.get_todo(todo.id).name == todo.name
+
+    def test_bulk_invalid_item(self, new_user_client):
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client.bulk_todos(
+                create=[{"name": "bulk_valid", "important": True}, {"name": "bulk"}]
+            )
+        assert excinfo.value.status_code == 400
+        assert new_user_client.get_todos() == ()
+
+    def test_bulk_update_null(self, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client_with_todos.bulk_todos(
+                update=[{"id": todo.id, "important": None}]
+            )
+        assert excinfo.value.status_code == 400
+
+    def test_bulk_update_no_fields(self, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        user = new_user_client_with_todos.get_user()
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client_with_todos.bulk_todos(update=[{"id": todo.id}])
+        assert excinfo.value.status_code == 400
+        assert new_user_client_with_todos.get_todo(todo.id) == todo
+        assert new_user_client_with_todos.get_user() == user
+
+    def test_bulk_update_duplicate_id(self, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client_with_todos.bulk_todos(
+                update=[{"id": todo.id, "done": True}, {"id": todo.id, "done": False}]
+            )
+        assert excinfo.value.status_code == 400
+        assert new_user_client_with_todos.get_todo(todo.id).done is False
+
+    def test_bulk_delete_duplicate_id(self, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client_with_todos.bulk_todos(delete=[todo.id, todo.id])
+        assert excinfo.value.status_code == 400
+        assert len(new_user_client_with_todos.get_todos()) == 2
+
+    def test_get_todos_not_modified(self, new_user_client_with_todos):
+        response = new_user_client_with_todos._call("GET", "/todo", response_type=None)
+        etag = response.headers["ETag"]
+        response = new_user_client_with_todos._call(
+            "GET", "/todo", response_type=None, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        todo_id = new_user_client_with_todos.create_todo("test_not_modified").id
+        response = new_user_client_with_todos._call(
+            "GET", "/todo", response_type=None, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        etag = response.headers["ETag"]
+        new_user_client_with_todos.update_todo(todo_id, done=True)
+        response = new_user_client_with_todos._call(
+            "GET",
+            f"/todo/{todo_id}",
+            response_type=None,
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 200
+
+    def test_update_todo_not_owner(
+        self, default_user_client, new_user_client_with_todos
+    ):
+        todo = new_user_client_with_todos.get_todos()[0]
+        with pytest.raises(HttpError) as excinfo:
+            default_user_client.update_todo(todo.id, name="stolen")
+        assert excinfo.value.status_code == 403
+        assert new_user_client_with_todos.get_todo(todo.id).name == todo.name
+
+    def test_update_todo_with_wrong_id(self, new_user_client):
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client.update_todo(9999999, name="missing")
+        assert excinfo.value.status_code == 404
+
+    def test_delete_todo(self, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        assert new_user_client_with_todos.delete_todo(todo.id).status == "ok"
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client_with_todos.get_todo(todo.id)
+        assert excinfo.value.status_code == 404
+
+    def test_delete_todo_not_owner(
+        self, default_user_client, new_user_client_with_todos
+    ):
+        todo = new_user_client_with_todos.get_todos()[0]
+        with pytest.raises(HttpError) as excinfo:
+            default_user_client.delete_todo(todo.id)
+        assert excinfo.value.status_code == 403
+        assert new_user_client_with_todos.get_todo(todo.id).id == todo.id
+
+    def test_delete_todo_with_wrong_id(self, new_user_client):
+        with pytest.raises(HttpError) as excinfo:
+            new_user_client.delete_todo(9999999)
+        assert excinfo.value.status_code == 404
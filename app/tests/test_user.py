@@ -1,4 +1,6 @@
 import pytest
+from crud import update_item
+from models import Session, Todo
 
 from .api_client import HttpError
 from .constants import DEFAULT_USER_NAME, DEFAULT_USER_PASSWORD, NEW_USER_NAME
@@ -91,3 +93,65 @@ class TestUser:
         with pytest.raises(HttpError) as excinfo:
             client.delete_user()
         assert excinfo.value.status_code == 401
+
+    def test_get_user_not_modified(self, new_user_client):
+        response = new_user_client._call("GET", "/user", response_type=None)
+        etag = response.headers["ETag"]
+        response = new_user_client._call(
+            "GET", "/user", response_type=None, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        new_user_client.update_user(name="test_get_user_not_modified")
+        response = new_user_client._call(
+            "GET", "/user", response_type=None, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+
+    def test_get_user_todo_counts(self, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        new_user_client_with_todos.update_todo(todo.id, done=True)
+        user = new_user_client_with_todos.get_user()
+        assert user.todo_counts == (2, 1, 1)
+        assert user.todos is None
+
+    def test_todo_counts_follow_writes(self, new_user_client):
+        client = new_user_client
+        first = client.create_todo("first", important=True).id
+        second = client.create_todo("second").id
+        assert client.get_user().todo_counts == (2, 0, 1)
+        client.update_todo(first, done=True)
+        client.update_todo(first, done=True)
+        assert client.get_user().todo_counts == (2, 1, 1)
+        client.delete_todo(first)
+        assert client.get_user().todo_counts == (1, 0, 0)
+        created = client.bulk_todos(
+            create=[
+                {"name": "third", "important": True},
+                {"name": "fourth", "important": False},
+            ]
+        ).create
+        third, fourth = (item.id for item in created)
+        assert client.get_user().todo_counts == (3, 0, 1)
+        client.bulk_todos(
+            update=[{"id": second, "done": True}, {"id": fourth, "important": True}],
+            delete=[third],
+        )
+        assert client.get_user().todo_counts == (2, 1, 1)
+        stats = client.get_todo_stats()
+        assert stats.todo_counts[:3] == client.get_user().todo_counts
+
+    def test_update_item_keeps_todo_counts(self, new_user_client_with_todos):
+        todo = new_user_client_with_todos.get_todos()[0]
+        with Session() as session:
+            update_item(session.get(Todo, todo.id), {"done": True}, session)
+        assert new_user_client_with_todos.get_user().todo_counts == (2, 1, 1)
+
+    def test_get_user_with_todos(self, new_user_client_with_todos):
+        todos = new_user_client_with_todos.get_todos()
+        user = new_user_client_with_todos.get_user(with_todos=True)
+        assert user.todos == [todo.id for todo in todos]
+
+    def test_get_user_without_todos(self, new_user_client):
+        user = new_user_client.get_user(with_todos=True)
+        assert user.todo_counts == (0, 0, 0)
+        assert user.todos == []
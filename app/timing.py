@@ -0,0 +1,87 @@
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger("todo.timing")
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.queries = 0
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+
+def get_timings() -> RequestTimings | None:
+    if not has_request_context():
+        return None
+    return g.get("timings")
+
+
+def start_timings():
+    g.timings = RequestTimings()
+
+
+@contextmanager
+def timed(phase: str):
+    timings = get_timings()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] += time.perf_counter() - start
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = get_timings()
+    if timings is not None:
+        timings.phases["db"] += time.perf_counter() - conn.info.pop("query_start")
+        timings.queries += 1
+
+
+def finish_timings(response: Response) -> Response:
+    timings = get_timings()
+    if timings is None:
+        return response
+    phases = {"db": 0.0, **timings.phases, "total": timings.total}
+    response.headers["Server-Timing"] = ", ".join(
+        f'db;dur={seconds * 1000:.2f};desc="{timings.queries} queries"'
+        if phase == "db"
+        else f"{phase};dur={seconds * 1000:.2f}"
+        for phase, seconds in phases.items()
+    )
+    if not logger.isEnabledFor(logging.INFO):
+        return response
+    logger.info(
+        json.dumps(
+            {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "queries": timings.queries,
+                **{
+                    f"{phase}_ms": round(seconds * 1000, 2)
+                    for phase, seconds in phases.items()
+                },
+            }
+        )
+    )
+    return response
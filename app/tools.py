@@ -1,25 +1,51 @@
+import orjson
 from errors import HttpError
 from flask import jsonify
+from metrics import observe_http_error
 from pydantic import ValidationError
 from schema import SCHEMA_MODEL
+from timing import timed
 
 
-def get_json_response(json_data: dict, status_code: int = 200):
-    response = jsonify(json_data)
+def get_json_response(json_data: dict | list, status_code: int = 200):
+    with timed("serialize"):
+        response = jsonify(json_data)
     response.status_code = status_code
     return response
 
 
 def handle_error(error: HttpError):
-    return get_json_response(
+    observe_http_error(error.status_code)
+    response = get_json_response(
         {"status": "error", "description": error.description}, error.status_code
     )
+    response.headers.update(error.headers)
+    return response
+
+
+def get_validation_error(er: ValidationError) -> HttpError:
+    error = er.errors()[0]
+    error.pop("ctx", None)
+    if isinstance(error.get("input"), bytes):
+        error.pop("input")
+    return HttpError(400, error)
 
 
 def validate(model: SCHEMA_MODEL, data: dict):
     try:
-        return model.model_validate(data).model_dump(exclude_unset=True)
+        with timed("validate"):
+            return model.model_validate(data).model_dump(exclude_unset=True)
+    except ValidationError as er:
+        raise get_validation_error(er)
+
+
+def validate_json(model: SCHEMA_MODEL, data: bytes):
+    try:
+        with timed("validate"):
+            try:
+                item = model.model_validate(orjson.loads(data))
+            except orjson.JSONDecodeError:
+                item = model.model_validate_json(data)
+            return item.model_dump(exclude_unset=True)
     except ValidationError as er:
-        error = er.errors()[0]
-        error.pop("ctx", None)
-        raise HttpError(400, error)
+        raise get_validation_error(er)
@@ -1,13 +1,106 @@
-from auth import check_owner, check_password, check_token, hash_password
-from crud import add_item, create_item, delete_item, get_item_by_id, update_item
+from auth import (
+    check_owner,
+    check_password,
+    check_token,
+    forget_user_tokens,
+    get_token_user,
+    hash_password,
+    needs_rehash,
+)
+from crud import (
+    bulk_todos,
+    create_item,
+    create_token,
+    delete_item,
+    delete_owned_item,
+    get_item_by_id,
+    get_next_page,
+    get_todo_changes,
+    get_todo_list,
+    get_todo_stats,
+    get_user_summary,
+    get_user_version,
+    revoke_tokens,
+    stream_todos,
+    update_item,
+    update_owned_item,
+)
 from errors import HttpError
-from flask import jsonify, request
+from flask import (
+    Response,
+    current_app,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask.views import MethodView
-from models import Todo, Token, User
-from schema import CreateTodo, CreateUser, Login, PatchUser, UpdateTodo
+from models import Todo, User
+from response_cache import (
+    CachedResponse,
+    get_cache_key,
+    get_cached_headers,
+    response_cache,
+)
+from schema import (
+    TODO_LIST_DEFAULT_LIMIT,
+    BulkTodo,
+    CreateTodo,
+    CreateUser,
+    Login,
+    LogoutQuery,
+    PatchUser,
+    TodoListQuery,
+    TodoStatsQuery,
+    UpdateTodo,
+    UserQuery,
+)
 from sqlalchemy import func
 from sqlalchemy.orm import Session
-from tools import validate
+from tools import get_json_response, validate, validate_json
+
+
+def conditional(handler):
+    def wrapper(self, *args, **kwargs):
+        version = get_user_version(self.user_id, self.session)
+        if version is None:
+            forget_user_tokens(self.user_id)
+            raise HttpError(401, "invalid token")
+        request.user_version = version
+        etag = f"{self.user_id}-{version}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = handler(self, *args, **kwargs)
+        response.set_etag(etag, weak=True)
+        return response
+
+    return wrapper
+
+
+def cached(handler):
+    def wrapper(self, *args, **kwargs):
+        key = get_cache_key(request.path, request.query_string.decode())
+        version = request.user_version
+        cached_response = response_cache.get(self.user_id, version, key)
+        if cached_response is not None:
+            return Response(
+                cached_response.body,
+                headers=cached_response.headers,
+                mimetype="application/json",
+            )
+        response = handler(self, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(
+                self.user_id,
+                version,
+                key,
+                CachedResponse(
+                    response.get_data(), get_cached_headers(response.headers)
+                ),
+            )
+        return response
+
+    return wrapper
 
 
 class BaseView(MethodView):
@@ -16,80 +109,135 @@ class BaseView(MethodView):
         return request.session
 
     @property
-    def token(self) -> Token:
-        return request.token
+    def user_id(self) -> int:
+        return request.user_id
 
     @property
     def user(self) -> User:
-        return request.token.user
+        return get_token_user(self.user_id, self.session)
 
 
 class UserView(BaseView):
     @check_token
+    @conditional
     def get(self):
-        return jsonify(self.user.dict)
+        query = validate(UserQuery, request.args.to_dict())
+        user = get_user_summary(self.user_id, self.session, **query)
+        if user is None:
+            forget_user_tokens(self.user_id)
+            raise HttpError(401, "invalid token")
+        return get_json_response(user)
 
     def post(self):
-        payload = validate(CreateUser, request.json)
+        payload = validate_json(CreateUser, request.get_data())
         payload["password"] = hash_password(payload["password"])
         user = create_item(User, payload, self.session)
-        return jsonify({"id": user.id})
+        return get_json_response({"id": user.id})
 
     @check_token
     def patch(self):
-        payload = validate(PatchUser, request.json)
-        user = update_item(self.token.user, payload, self.session)
-        return jsonify({"id": user.id})
+        payload = validate_json(PatchUser, request.get_data())
+        if "password" in payload:
+            payload["password"] = hash_password(payload["password"])
+        user = update_item(self.user, payload, self.session)
+        return get_json_response({"id": user.id})
 
     @check_token
     def delete(self):
-        delete_item(self.token.user, self.session)
-        return jsonify({"status": "ok"})
+        delete_item(self.user, self.session)
+        forget_user_tokens(self.user_id)
+        return get_json_response({"status": "ok"})
 
 
 class LoginView(BaseView):
     def post(self):
-        payload = validate(Login, request.json)
+        payload = validate_json(Login, request.get_data())
         user = self.session.query(User).filter_by(name=payload["name"]).first()
         if user is None:
             raise HttpError(404, "user not found")
         if check_password(user.password, payload["password"]):
-            token = create_item(Token, {"user_id": user.id}, self.session)
-            add_item(token, self.session)
-            return jsonify({"token": token.token})
+            if needs_rehash(user.password):
+                user.password = hash_password(payload["password"])
+            return get_json_response(create_token(user.id, self.session))
         raise HttpError(401, "invalid password")
 
+    @check_token
+    def delete(self):
+        query = validate(LogoutQuery, request.args.to_dict())
+        token_id = None if query.get("all") else request.token_id
+        revoke_tokens(self.user_id, self.session, token_id)
+        return get_json_response({"status": "ok"})
+
 
 class TodoView(BaseView):
     @check_token
+    @conditional
+    @cached
     def get(self, todo_id: int = None):
         if todo_id is None:
-            return jsonify([todo.dict for todo in self.user.todos])
+            return self.get_list()
         todo = get_item_by_id(Todo, todo_id, self.session)
-        check_owner(todo, self.token.user_id)
-        return jsonify(todo.dict)
+        check_owner(todo, self.user_id)
+        return get_json_response(todo.dict)
+
+    def get_list(self):
+        query = validate(TodoListQuery, request.args.to_dict())
+        if "since" in query:
+            changes = get_todo_changes(self.user_id, self.session, query["since"])
+            return get_json_response(changes)
+        todos = get_todo_list(self.user_id, self.session, **query)
+        response = get_json_response([todo.dict for todo in todos])
+        if len(todos) == query.get("limit", TODO_LIST_DEFAULT_LIMIT):
+            next_url = url_for("todo", **get_next_page(query, todos[-1].id))
+            response.headers["Link"] = f'<{next_url}>; rel="next"'
+        return response
 
     @check_token
     def post(self):
-        payload = validate(CreateTodo, request.json)
-        todo = create_item(
-            Todo, dict(user_id=self.token.user_id, **payload), self.session
-        )
-        return jsonify({"id": todo.id})
+        payload = validate_json(CreateTodo, request.get_data())
+        todo = create_item(Todo, dict(user_id=self.user_id, **payload), self.session)
+        return get_json_response({"id": todo.id})
 
     @check_token
     def patch(self, todo_id: int):
-        payload = validate(UpdateTodo, request.json)
+        payload = validate_json(UpdateTodo, request.get_data())
         if "done" in payload:
             payload["finish_time"] = func.now()
-        todo = get_item_by_id(Todo, todo_id, self.session)
-        check_owner(todo, self.token.user_id)
-        todo = update_item(todo, payload, self.session)
-        return jsonify({"id": todo.id})
+        todo_id = update_owned_item(Todo, todo_id, self.user_id, payload, self.session)
+        return get_json_response({"id": todo_id})
 
     @check_token
     def delete(self, todo_id: int):
-        todo = get_item_by_id(Todo, todo_id, self.session)
-        check_owner(todo, self.token.user_id)
-        delete_item(todo, self.session)
-        return jsonify({"status": "ok"})
+        delete_owned_item(Todo, todo_id, self.user_id, self.session)
+        return get_json_response({"status": "ok"})
+
+
+class TodoStatsView(BaseView):
+    @check_token
+    @conditional
+    @cached
+    def get(self):
+        query = validate(TodoStatsQuery, request.args.to_dict())
+        return get_json_response(get_todo_stats(self.user_id, self.session, **query))
+
+
+class TodoExportView(BaseView):
+    @check_token
+    def get(self):
+        todos = stream_todos(self.user.id, self.session)
+        dumps = current_app.json.dumps_bytes
+
+        def generate():
+            for todo in todos:
+                yield dumps(todo.dict) + b"\n"
+
+        return Response(
+            stream_with_context(generate()), mimetype="application/x-ndjson"
+        )
+
+
+class TodoBulkView(BaseView):
+    @check_token
+    def post(self):
+        payload = validate_json(BulkTodo, request.get_data())
+        return get_json_response(bulk_todos(self.user_id, payload, self.session))